@@ -7,3 +7,5 @@ class ApiConfig(AppConfig):
     
     def ready(self):
         import api.signals.product_signals
+        import api.signals.order_signals
+        import api.signals.table_signals
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+from core.utils.search import normalize_search_text
+
+
+def fill_search_text(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    products = list(Product.objects.only('id', 'name', 'description'))
+    for product in products:
+        product.search_text = normalize_search_text(f"{product.name} {product.description or ''}")
+    Product.objects.bulk_update(products, ['search_text'], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    # GIN trigram chỉ có trên PostgreSQL, SQLite (test) bỏ qua
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS api_product_search_text_trgm "
+        "ON api_product USING gin (search_text gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS api_product_search_text_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_product_is_menu_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
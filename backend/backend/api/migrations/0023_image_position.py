@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_image_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['product', 'position', 'id'], name='image_product_position_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_item_statuses(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    # đơn đã phục vụ / thanh toán => mọi món coi như đã phục vụ
+    OrderItem.objects.filter(order__status__in=('served', 'paid')).update(status='served')
+    counts = {}
+    rows = OrderItem.objects.values_list('order_id', 'status').annotate(total=Count('id')).order_by()
+    for order_id, status, total in rows:
+        counts.setdefault(order_id, {})[status] = total
+    orders = list(Order.objects.filter(id__in=counts).only('id'))
+    for order in orders:
+        order.item_status_counts = counts[order.id]
+    Order.objects.bulk_update(orders, ['item_status_counts'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_image_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_status_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('served', 'Served'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(fill_item_statuses, migrations.RunPython.noop),
+    ]
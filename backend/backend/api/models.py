@@ -6,6 +6,7 @@ from django.conf import settings
 
 from django.contrib.auth.models import AbstractUser
 from cloudinary.models import CloudinaryField
+from core.utils.search import normalize_search_text
 
 class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True)
@@ -17,6 +18,14 @@ class User(AbstractUser):
         ('cashier', 'Cashier'),
         ('customer', 'Customer')
     ), default='customer')
+
+    class Meta(AbstractUser.Meta):
+        # index cho keyset pagination (ordering field, id)
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_id_idx'),
+            models.Index(fields=['first_name', 'id'], name='user_first_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -45,6 +54,22 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # dùng cho bếp (bật / tắt menu)
     is_menu_active = models.BooleanField(default=True)
+    # tên + mô tả đã bỏ dấu, chữ thường => tìm kiếm (GIN trigram index trên PostgreSQL)
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search_text(f"{self.name} {self.description or ''}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'description'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        # index cho keyset pagination (ordering field, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -81,6 +106,12 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # index cho keyset pagination (ordering field, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='reservation_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Reservation for {self.customer_name} at {self.reservation_time}"
 # CART MODEL
@@ -117,11 +148,49 @@ class Order(models.Model):
         ('preparing', 'Preparing'),
         ('served', 'Served'),
         ('paid', 'Paid'),
+        ('cancelled', 'Cancelled'),
     ), default='preparing')
+    # số order item theo từng trạng thái, cập nhật cùng lúc với item (không phải đếm lại khi đọc)
+    item_status_counts = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # order đang mở của bàn = chưa thanh toán (served: món đã ra hết nhưng chưa trả tiền)
+    OPEN_STATUSES = ('pending', 'preparing', 'served')
+
+    class Meta:
+        # index cho keyset pagination (ordering field, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # filter của trang admin orders
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['table', '-created_at'], name='order_table_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} for Table {self.table.number}"
+
+    def refresh_item_status_counts(self):
+        """
+        Đếm lại từ DB (1 query aggregate) cho các thao tác hiếm như tách món;
+        đường chính (chuyển trạng thái món) cập nhật tăng dần.
+        """
+        rows = self.order_items.values_list('status').annotate(total=models.Count('id')).order_by()
+        self.item_status_counts = {status: total for status, total in rows}
+        self.status = self.derive_status()
+
+    def derive_status(self):
+        """
+        Trạng thái order suy ra từ item_status_counts: không còn món đang làm => đóng order
+        (served nếu có món đã phục vụ, hủy hết => cancelled). Order đã thanh toán giữ nguyên paid.
+        """
+        if self.status == 'paid':
+            return 'paid'
+        counts = self.item_status_counts or {}
+        open_items = sum(count for status, count in counts.items() if status not in OrderItem.CLOSED_STATUSES)
+        if counts and open_items == 0:
+            return 'served' if counts.get('served') else 'cancelled'
+        return 'preparing'
     
 # ORDERITEM MODEL
 class OrderItem(models.Model):
@@ -130,12 +199,34 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
+    # trạng thái chế biến từng món: pending -> preparing -> ready -> served, hủy được khi chưa xong
+    status = models.CharField(max_length=20, choices=(
+        ('pending', 'Pending'),
+        ('preparing', 'Preparing'),
+        ('ready', 'Ready'),
+        ('served', 'Served'),
+        ('cancelled', 'Cancelled'),
+    ), default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    TRANSITIONS = {
+        'pending': ('preparing', 'ready', 'cancelled'),
+        'preparing': ('ready', 'cancelled'),
+        'ready': ('served',),
+        'served': (),
+        'cancelled': (),
+    }
+    CLOSED_STATUSES = ('served', 'cancelled')
+
     class Meta:
         unique_together = ('order', 'product')
     def __str__(self):
         return f"OrderItem for {self.product.name} in Order {self.order.id}"
+
+    @classmethod
+    def can_transition(cls, current, target):
+        return target in cls.TRANSITIONS.get(current, ())
 # Image MODEL
 class Image(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
@@ -145,6 +236,16 @@ class Image(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # thuộc tính đẻ tránh chọn ảnh trùng (thêm)
     image_hash = models.CharField(max_length=64, null=True, blank=True)
+    # dHash 64 bit (hex) để phát hiện ảnh gần giống (resize / nén lại)
+    perceptual_hash = models.CharField(max_length=16, null=True, blank=True)
+    # thứ tự hiển thị trong gallery của sản phẩm (nhỏ => trước)
+    position = models.PositiveIntegerField(default=0)
+    # ảnh upload lên Cloudinary ở worker nền: pending -> ready / failed
+    status = models.CharField(max_length=20, choices=(
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ), default='ready')
     
     class Meta:
         constraints = [
@@ -153,6 +254,9 @@ class Image(models.Model):
                 name='unique_image_per_product'
             )
         ]
+        indexes = [
+            models.Index(fields=['product', 'position', 'id'], name='image_product_position_idx'),
+        ]
     
     objects = models.Manager()
     def __str__(self):
@@ -0,0 +1,111 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Phân trang keyset (cursor) theo cặp (ordering field, id).
+    - Không dùng OFFSET => trang sau nhanh như trang đầu, không bị lệch khi có dòng mới chèn vào.
+    - Chỉ bật khi client gửi `cursor` hoặc `page_size`, không gửi thì trả list như cũ.
+    Cursor là base64 của [giá trị field, id] của dòng cuối trang trước.
+    ordering có thể là field đã annotate (vd. '-search_rank' khi tìm kiếm).
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor không hợp lệ.'
+
+    def __init__(self, ordering='-created_at'):
+        self.ordering = ordering
+        self.field_name = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.next_cursor = None
+        self.request = None
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.field_name)
+        # datetime / Decimal => chuỗi, Django tự parse lại khi filter
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value), instance.pk])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def get_ordering_field(self, queryset):
+        annotation = queryset.query.annotations.get(self.field_name)
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            return queryset.model._meta.get_field(self.field_name)
+        except FieldDoesNotExist:
+            return None
+
+    def decode_cursor(self, request, field=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            # cursor giải mã được nhưng giá trị sai kiểu => 404 thay vì lỗi 500 khi filter
+            if field is not None:
+                value = field.to_python(value)
+            return value, int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        page_size = self.get_page_size(request)
+        id_ordering = '-id' if self.descending else 'id'
+        queryset = queryset.order_by(self.ordering, id_ordering)
+
+        cursor = self.decode_cursor(request, self.get_ordering_field(queryset))
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if self.descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field_name}__{lookup}': value}) |
+                Q(**{self.field_name: value, f'id__{lookup}': pk})
+            )
+
+        # lấy dư 1 dòng để biết còn trang sau hay không, không cần COUNT(*)
+        items = list(queryset[:page_size + 1])
+        page = items[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(items) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_payload(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_payload(data))
@@ -11,4 +11,8 @@ class IsAdminUser(BasePermission):
         return request.user.is_authenticated and getattr(request.user, 'role', None) == 'admin'
 class IsCashierUser(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and getattr(request.user,'role',None) == 'cashier'
\ No newline at end of file
+        return request.user.is_authenticated and getattr(request.user,'role',None) == 'cashier'
+class IsKitchenStaff(BasePermission):
+    # bếp đổi trạng thái món, phục vụ báo đã mang ra bàn
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and getattr(request.user, 'role', None) in ('chef', 'waiter', 'admin')
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from api.models import CartItem,Product,Table
 from api.serializers import ProductSerializer,TableSerializer
+from core.utils.table_status import set_table_status
 
 from django.db import models
 
@@ -45,10 +46,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             cart_item.quantity +=quantity
             cart_item.note = note
             
-        table = cart.table
-        if table.status in ["available","reserved"]:
-            table.status = "occupied"
-            table.save(update_fields=['status'])
+        set_table_status(cart.table, "occupied")
         cart_item.save()
         return cart_item
 
@@ -59,9 +57,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             cart = instance.cart
             instance.delete()
             if not cart.cart_items.exists():
-                table = cart.table
-                table.status = "available"
-                table.save(update_fields=['status'])
+                set_table_status(cart.table, "available")
             return None
         else:
             instance.quantity = quantity
@@ -0,0 +1,80 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_projection(request):
+    """
+    Đọc ?fields=a,b và ?omit=c từ request => (fields, omit), không có thì None.
+    """
+    if request is None:
+        return None, None
+
+    def split(param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    return split('fields'), split('omit')
+
+
+class FieldProjectionMixin:
+    """
+    Cho client chọn field trả về: ?fields=id,name hoặc ?omit=description.
+    Có thể truyền fields=/omit= trực tiếp khi khởi tạo serializer.
+    Meta.projection_sources: field không phải cột của model => các cột cần để tính
+    (dùng cho queryset.only()).
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if fields is None and omit is None and request is not None and request.method in SAFE_METHODS:
+            # chỉ cắt field khi đọc, không ảnh hưởng dữ liệu ghi
+            fields, omit = parse_projection(request)
+
+        keep = self.select_field_names(fields, omit)
+        if keep is not None:
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def select_field_names(cls, fields=None, omit=None):
+        """
+        Tập field giữ lại. Tên field không có trong serializer => 400 liệt kê các tên sai
+        (không âm thầm bỏ qua rồi trả về object rỗng).
+        """
+        if not fields and not omit:
+            return None
+        available = set(cls.Meta.fields)
+        errors = {}
+        for param, names in (('fields', fields), ('omit', omit)):
+            unknown = [name for name in names or () if name not in available]
+            if unknown:
+                errors[param] = f"Field không tồn tại: {', '.join(unknown)}"
+        if errors:
+            raise serializers.ValidationError(errors)
+        keep = set(fields) if fields else available
+        if omit:
+            keep -= set(omit)
+        return keep
+
+    @classmethod
+    def projected_columns(cls, field_names):
+        """
+        Các cột cần SELECT cho tập field đã chọn (luôn có id).
+        """
+        model = cls.Meta.model
+        sources = getattr(cls.Meta, 'projection_sources', {})
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {'id'}
+        for name in field_names:
+            if name in sources:
+                columns.update(sources[name])
+            elif name in concrete:
+                columns.add(name)
+        return sorted(columns)
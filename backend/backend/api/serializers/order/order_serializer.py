@@ -1,7 +1,20 @@
+from collections import Counter
+
 from rest_framework import serializers
 from api.models import Order,OrderItem,Table,CartItem,Product,Cart
 from django.db import transaction
-from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from api.serializers.mixins import FieldProjectionMixin
+from core.utils.kitchen import publish_order_tickets, update_ticket_items_on_commit
+
+
+class CartLockedError(APIException):
+    # cart đã bị khóa bởi một đơn khác (gửi trùng) => 409 thay vì 400
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Giỏ hàng của bàn này đã được gửi xuống bếp."
+    default_code = 'cart_locked'
 
 class OrderCartItemSerializer(serializers.ModelSerializer):
     total = serializers.SerializerMethodField()
@@ -22,17 +35,35 @@ class OrderItemSerializer(serializers.ModelSerializer):
     product = OrderProductSerializer(read_only=True)  # Hiển thị chi tiết món
     class Meta:
         model = OrderItem
-        fields = ['product', 'quantity', 'price', 'description']
+        fields = ['id', 'product', 'quantity', 'price', 'description', 'status']
         
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     table_number = serializers.CharField(source='table.number',read_only = True)
     table_status = serializers.CharField(source='table.status',read_only = True)
     items = OrderItemSerializer(source='order_items',many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'table_number', 'table_status', 'items', 'total_amount', 'status', 'created_at')
+        fields = ('id', 'table_number', 'table_status', 'items', 'item_status_counts', 'total_amount', 'status', 'created_at')
         read_only_fields = fields
+        projection_sources = {
+            'table_number': ['table', 'table__number'],
+            'table_status': ['table', 'table__status'],
+            'items': [],
+        }
+    @classmethod
+    def setup_eager_loading(cls, queryset, field_names=None):
+        """
+        Nạp trước bàn + order items + món => số query cố định dù có bao nhiêu đơn.
+        field_names (đã chọn qua ?fields/?omit) => chỉ SELECT / prefetch phần cần thiết.
+        """
+        if field_names is not None:
+            queryset = queryset.only(*cls.projected_columns(field_names))
+        if field_names is None or {'table_number', 'table_status'} & set(field_names):
+            queryset = queryset.select_related('table')
+        if field_names is None or 'items' in field_names:
+            queryset = queryset.prefetch_related('order_items__product')
+        return queryset
         
 class CreateOrderSerializer(serializers.Serializer):
     table = serializers.PrimaryKeyRelatedField(queryset=Table.objects.all())
@@ -45,14 +76,18 @@ class CreateOrderSerializer(serializers.Serializer):
     
     def validate(self, data):
         table = data['table']
-        cart = Cart.objects.filter(table=table, status='active').first()
+        # khóa cart tới hết transaction => 2 máy gửi cùng lúc thì máy sau phải chờ
+        cart = Cart.objects.select_for_update().filter(table=table).first()
         if not cart:
             raise serializers.ValidationError("Giỏ hàng không tồn tại cho bàn này.")
+        if cart.status != 'active':
+            raise CartLockedError()
         
         cartitems_ids = [item.get('id') for item in data['cartitems']]
-        cartitems = CartItem.objects.filter(id__in=cartitems_ids, cart=cart)
+        # 1 query duy nhất: cart items + product (giá) + category (trạm bếp) dùng lại ở create()
+        cartitems = list(CartItem.objects.filter(id__in=cartitems_ids, cart=cart).select_related('product__category'))
         
-        if cartitems.count() != len(cartitems_ids):
+        if len(cartitems) != len(cartitems_ids):
             raise serializers.ValidationError("Một số sản phẩm trong giỏ hàng không tồn tại.")
         
         data['cart'] = cart
@@ -64,27 +99,29 @@ class CreateOrderSerializer(serializers.Serializer):
         table = validated_data['table']
         cart = validated_data['cart']
         cartitems = validated_data['cartitems_queryset']
-        total = sum(item.product.price * item.quantity for item in cartitems)
+
+        # gộp các cart item trùng món + tính tổng tiền trong cùng 1 vòng lặp
+        lines = {}
+        total = 0
+        for item in cartitems:
+            product = item.product
+            line = lines.setdefault(product.id, {'product': product, 'price': product.price, 'quantity': 0})
+            line['quantity'] += item.quantity
+            total += product.price * item.quantity
+
         order = Order.objects.create(
             table=table,
             total_amount=total,
-            status='preparing'
+            status='preparing',
+            item_status_counts={'pending': len(lines)},
         )
-        
-        for item in cartitems:
-            order_item, created = OrderItem.objects.get_or_create(
-                order=order,
-                product=item.product,
-                defaults={
-                    'price': item.product.price,
-                    'quantity': item.quantity
-                }
-            )
-
-            if not created:
-                    # Nếu đã tồn tại → cộng dồn
-                    order_item.quantity = F('quantity') + item.quantity
-                    order_item.save()
+        # ghi toàn bộ order items bằng 1 câu INSERT
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=line['product'], price=line['price'], quantity=line['quantity'])
+            for line in lines.values()
+        ])
+        # ticket theo trạm xuống ws/kitchen/ sau khi commit
+        publish_order_tickets(order, order_items)
         
         # Xóa các mục trong giỏ hàng sau khi tạo đơn hàng
         cart.cart_items.all().delete()
@@ -93,3 +130,58 @@ class CreateOrderSerializer(serializers.Serializer):
 
         return order
 
+class OrderItemTransitionSerializer(serializers.Serializer):
+    """
+    Chuyển trạng thái nhiều món 1 lần: kiểm tra theo OrderItem.TRANSITIONS,
+    ghi bằng 1 câu UPDATE ... WHERE id IN (...), cộng dồn item_status_counts của order.
+    Món bị hủy => trừ price * quantity khỏi total_amount của order trong cùng transaction.
+    Có món không hợp lệ => không món nào bị đổi.
+    """
+    items = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.ChoiceField(choices=[choice for choice, _ in OrderItem._meta.get_field('status').choices])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        item_ids = set(validated_data['items'])
+        target = validated_data['status']
+        rows = list(
+            OrderItem.objects.select_for_update().filter(id__in=item_ids)
+            .values_list('id', 'order_id', 'status', 'price', 'quantity')
+        )
+        missing = item_ids - {item_id for item_id, *_ in rows}
+        if missing:
+            raise serializers.ValidationError({"items": f"Không tìm thấy món: {sorted(missing)}"})
+        invalid = sorted(item_id for item_id, _, current, *_ in rows if not OrderItem.can_transition(current, target))
+        if invalid:
+            raise serializers.ValidationError({"items": f"Không thể chuyển sang '{target}': {invalid}"})
+
+        now = timezone.now()
+        OrderItem.objects.filter(id__in=item_ids).update(status=target, updated_at=now)
+
+        # cộng dồn thay đổi theo order, không đếm lại toàn bộ món
+        deltas = {}
+        refunds = Counter()
+        for _, order_id, current, price, quantity in rows:
+            delta = deltas.setdefault(order_id, Counter())
+            delta[current] -= 1
+            delta[target] += 1
+            if target == 'cancelled':
+                refunds[order_id] += price * quantity
+        orders = list(Order.objects.select_for_update().filter(id__in=deltas).order_by('id'))
+        for order in orders:
+            counts = dict(order.item_status_counts or {})
+            for item_status, change in deltas[order.id].items():
+                counts[item_status] = counts.get(item_status, 0) + change
+                if counts[item_status] <= 0:
+                    counts.pop(item_status)
+            order.item_status_counts = counts
+            order.total_amount -= refunds[order.id]
+            order.status = order.derive_status()
+            order.updated_at = now
+        Order.objects.bulk_update(orders, ['item_status_counts', 'total_amount', 'status', 'updated_at'])
+
+        update_ticket_items_on_commit(
+            item_ids, target, [order.id for order in orders if order.status not in ('pending', 'preparing')]
+        )
+        return orders
+
@@ -4,22 +4,46 @@ from api.models import Product, Category,Image
 from rest_framework.response import Response
 from rest_framework import serializers
 import cloudinary
+from django.conf import settings
 from django.db import transaction
 from django.db import IntegrityError
+from django.db.models import Case, F, IntegerField, Max, Prefetch, Value, When
 
-from core.utils.cloudinary_image_utils import build_cloudinary_url
-from core.utils.image_hash import hash_image
+from core.utils.cloudinary_image_utils import build_cloudinary_url, build_image_variants
+from core.utils.image_ingest import InvalidImageError, stage_upload, schedule_image_upload
+from core.utils.perceptual_hash import BKTree, dhash, find_near_duplicates, get_catalog_index, invalidate_catalog_index_on_commit
+from core.utils.menu_cache import bump_catalog_version_on_commit
+from core.utils.realtime import broadcast_utils
+from api.serializers.mixins import FieldProjectionMixin
+
+def stage_image_or_error(image_file):
+    # 1 lượt đọc file: hash + kiểm tra ảnh + ghi file tạm cho worker upload
+    try:
+        return stage_upload(image_file)
+    except InvalidImageError as e:
+        raise serializers.ValidationError({"image": str(e)})
+
+def find_catalog_near_duplicates(perceptual_hash, tree=None):
+    # IMAGE_NEAR_DUPLICATE_MODE=off => không tìm
+    if getattr(settings, 'IMAGE_NEAR_DUPLICATE_MODE', 'warn') == 'off':
+        return []
+    return find_near_duplicates(perceptual_hash, getattr(settings, 'IMAGE_NEAR_DUPLICATE_DISTANCE', 5), tree=tree)
 
 class ImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     class Meta:
         model = Image
-        fields = ('id', 'image', 'is_primary', 'created_at', 'image_url')
-        read_only_fields = ('id', 'created_at', 'image_url')
+        fields = ('id', 'image', 'is_primary', 'position', 'status', 'created_at', 'image_url', 'image_variants')
+        read_only_fields = ('id', 'position', 'status', 'created_at', 'image_url', 'image_variants')
+    # ảnh gần giống tìm thấy lúc create (chế độ warn), ImageViewSet trả kèm response
+    near_duplicates = ()
     def get_image_url(self, obj):
         if obj.image:
-            return f"https://res.cloudinary.com/diwwq8qyt/image/upload/{obj.image}"
+            return build_cloudinary_url(obj.image, secure=True)
         return None
+    def get_image_variants(self, obj):
+        return build_image_variants(obj.image)
     # có sửa
     @transaction.atomic
     def create(self,validated_data):
@@ -33,17 +57,26 @@ class ImageSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Thiếu ảnh")
         
         # tính hash image
-        image_hash = hash_image(image_file)
+        staged = stage_image_or_error(image_file)
+        image_hash = staged.sha256
         
         # check trùng ảnh trong cùng Product
         if Image.objects.filter(product=product, image_hash=image_hash).exists():
+            staged.discard()
             raise serializers.ValidationError(
                 {"image": "Ảnh này đã tồn tại trong sản phẩm này"}
             )
+
+        # ảnh đã resize / nén lại: so perceptual hash với toàn bộ catalog
+        perceptual_hash = dhash(staged.path)
+        self.near_duplicates = find_catalog_near_duplicates(perceptual_hash)
+        if self.near_duplicates and getattr(settings, 'IMAGE_NEAR_DUPLICATE_MODE', 'warn') == 'reject':
+            staged.discard()
+            ids = ', '.join(str(item['id']) for item in self.near_duplicates)
+            raise serializers.ValidationError(
+                {"image": f"Ảnh gần giống ảnh đã có trong catalog (id: {ids})"}
+            )
         
-        # reset pointer để cloudinary upload không bị lỗi
-        image_file.seek(0)
-            
         validated_data['product'] = product
             
         # chỗ đc thêm vào
@@ -53,46 +86,47 @@ class ImageSerializer(serializers.ModelSerializer):
                 is_primary=True
             ).update(is_primary=False)
             
-        image = validated_data.get('image')
-        upload_result = cloudinary.uploader.upload(image)
-        validated_data['image'] = upload_result['public_id']
+        # tạo row pending ngay, upload Cloudinary ở worker nền sau commit
+        validated_data['image'] = None
         validated_data['image_hash'] = image_hash
+        validated_data['perceptual_hash'] = perceptual_hash
+        validated_data['status'] = 'pending'
+        validated_data['position'] = next_image_position(product)
         try:
-            return Image.objects.create(**validated_data)
+            image = Image.objects.create(**validated_data)
         except IntegrityError:
+            staged.discard()
             raise serializers.ValidationError(
                 {"image": "Ảnh này đã tồn tại trong sản phẩm này"}
             )
+        schedule_image_upload(image.id, staged.path, image_hash)
+        return image
     # có sửa
     @transaction.atomic
     def update(self, instance, validated_data):
         image = validated_data.get('image', None)
+        staged = None
         if image and hasattr(image, 'read'):
             #----
             # tính hash image
-            image_hash = hash_image(image)
+            staged = stage_image_or_error(image)
+            image_hash = staged.sha256
             # check trùng lặp ảnh
             if Image.objects.filter(
                 product=instance.product,
                 image_hash=image_hash
             ).exclude(id=instance.id).exists():
+                staged.discard()
                 raise serializers.ValidationError(
                     {"image": "Ảnh này đã tồn tại trong sản phẩm này"}
                 )
-            # reset pointer để cloudinary upload không bị lỗi
-            image.seek(0)
-            
-            # Xóa ảnh cũ (instance.image là string)
-            if instance.image:
-                try:
-                    cloudinary.uploader.destroy(instance.image)
-                except Exception as e:
-                    print(">>> DEBUG: Lỗi khi xóa ảnh cũ:", e)
-
-            # Upload ảnh mới lên Cloudinary
-            upload_result = cloudinary.uploader.upload(image)
-            validated_data['image'] = upload_result['public_id']
+            # giữ ảnh cũ tới khi worker upload xong ảnh mới (worker xóa ảnh cũ sau đó)
+            validated_data.pop('image')
             validated_data['image_hash'] = image_hash
+            validated_data['perceptual_hash'] = dhash(staged.path)
+            validated_data['status'] = 'pending'
+            # hash cũ vẫn nằm trong BK-tree => dựng lại index
+            invalidate_catalog_index_on_commit()
 
         else:
             # Không có ảnh mới → giữ nguyên ảnh cũ
@@ -107,36 +141,229 @@ class ImageSerializer(serializers.ModelSerializer):
 
         # Cập nhật các trường khác
         instance.is_primary = validated_data.get('is_primary', instance.is_primary)
-        instance.image = validated_data.get('image', instance.image)
         instance.image_hash = validated_data.get('image_hash', instance.image_hash)
+        instance.perceptual_hash = validated_data.get('perceptual_hash', instance.perceptual_hash)
+        instance.status = validated_data.get('status', instance.status)
         
         try:
-            instance.save()
+            # không ghi cột image: worker có thể vừa swap public_id, ghi lại bản đọc lúc request sẽ đè mất
+            instance.save(update_fields=['is_primary', 'image_hash', 'perceptual_hash', 'status', 'updated_at'])
         except IntegrityError:
+            if staged:
+                staged.discard()
             raise serializers.ValidationError(
                 {"image": "Ảnh này đã tồn tại trong sản phẩm này"}
             )
+
+        if staged:
+            schedule_image_upload(instance.id, staged.path, staged.sha256)
             
         return instance
 
-class ProductSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(required=False, write_only=True)
+def next_image_position(product):
+    last = Image.objects.filter(product=product).aggregate(last=Max('position'))['last']
+    return 0 if last is None else last + 1
+
+class BulkImageUploadSerializer(serializers.Serializer):
+    """
+    Upload nhiều ảnh 1 lần: stage + hash từng file (1 lượt đọc), lọc trùng trong batch
+    và với DB bằng 1 query, tạo row bằng 1 bulk INSERT, upload ở worker pool giới hạn.
+    File lỗi / trùng không làm hỏng cả batch, trả về trong skipped.
+    """
+    images = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+
+    def validate_images(self, value):
+        limit = getattr(settings, 'IMAGE_BULK_MAX_FILES', 200)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"Tối đa {limit} ảnh mỗi lần upload.")
+        return value
+
+    @transaction.atomic
+    def create(self, validated_data):
+        product = self.context['product']
+        reject_near = getattr(settings, 'IMAGE_NEAR_DUPLICATE_MODE', 'warn') == 'reject'
+        staged_files, skipped, seen = [], [], set()
+        for image_file in validated_data['images']:
+            try:
+                staged = stage_upload(image_file)
+            except InvalidImageError as e:
+                skipped.append({"name": image_file.name, "reason": "invalid", "detail": str(e)})
+                continue
+            if staged.sha256 in seen:
+                staged.discard()
+                skipped.append({"name": image_file.name, "reason": "duplicate"})
+                continue
+            seen.add(staged.sha256)
+            staged_files.append((image_file.name, staged))
+
+        existing = set(
+            Image.objects.filter(product=product, image_hash__in=seen).values_list('image_hash', flat=True)
+        )
+        rows, near_duplicates = [], {}
+        check_near = getattr(settings, 'IMAGE_NEAR_DUPLICATE_MODE', 'warn') != 'off'
+        catalog = get_catalog_index() if check_near else None
+        # ảnh đã nhận trong batch này (chưa có trong catalog) => bắt được ảnh gần giống nhau trong cùng batch
+        batch = BKTree()
+        for name, staged in staged_files:
+            if staged.sha256 in existing:
+                staged.discard()
+                skipped.append({"name": name, "reason": "duplicate"})
+                continue
+            perceptual_hash = dhash(staged.path)
+            matches = find_catalog_near_duplicates(perceptual_hash, tree=catalog)
+            if check_near and perceptual_hash is not None:
+                matches += [
+                    {"name": other, "distance": distance}
+                    for distance, other in batch.search(
+                        int(perceptual_hash, 16), getattr(settings, 'IMAGE_NEAR_DUPLICATE_DISTANCE', 5)
+                    )
+                ]
+            if matches and reject_near:
+                staged.discard()
+                skipped.append({"name": name, "reason": "near_duplicate", "near_duplicates": matches})
+                continue
+            if matches:
+                near_duplicates[name] = matches
+            if perceptual_hash is not None:
+                batch.add(int(perceptual_hash, 16), name)
+            rows.append((name, staged, perceptual_hash))
+
+        position = next_image_position(product)
+        has_primary = Image.objects.filter(product=product, is_primary=True).exists()
+        images = [
+            Image(
+                product=product, image=None, image_hash=staged.sha256, perceptual_hash=perceptual_hash,
+                # sản phẩm chưa có ảnh chính => ảnh đầu tiên của batch làm ảnh chính
+                is_primary=not has_primary and index == 0, position=position + index, status='pending',
+            )
+            for index, (name, staged, perceptual_hash) in enumerate(rows)
+        ]
+        try:
+            Image.objects.bulk_create(images)
+        except IntegrityError:
+            for name, staged, perceptual_hash in rows:
+                staged.discard()
+            raise serializers.ValidationError({"images": "Ảnh đã tồn tại trong sản phẩm này"})
+
+        # bulk_create không phát signal => worker upload xong sẽ phát IMAGE_UPDATED cho từng ảnh
+        for image, (name, staged, perceptual_hash) in zip(images, rows):
+            schedule_image_upload(image.id, staged.path, staged.sha256)
+        if images:
+            bump_catalog_version_on_commit()
+        return {
+            "created": ImageSerializer(images, many=True).data,
+            "skipped": skipped,
+            "near_duplicates": near_duplicates,
+        }
+
+class ImageReorderSerializer(serializers.Serializer):
+    """
+    Sắp xếp lại gallery + chọn ảnh chính trong 1 transaction, mỗi việc 1 câu UPDATE.
+    order: toàn bộ id ảnh của sản phẩm theo thứ tự mới.
+    """
+    order = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    primary = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        product = self.context['product']
+        order = attrs['order']
+        if len(set(order)) != len(order):
+            raise serializers.ValidationError({"order": "Danh sách ảnh bị trùng."})
+        current = set(Image.objects.filter(product=product).values_list('id', flat=True))
+        if set(order) != current:
+            raise serializers.ValidationError({"order": "Phải gồm đúng toàn bộ ảnh của sản phẩm."})
+        if 'primary' in attrs and attrs['primary'] not in current:
+            raise serializers.ValidationError({"primary": "Ảnh không thuộc sản phẩm này."})
+        return attrs
+
+    @transaction.atomic
+    def create(self, validated_data):
+        product = self.context['product']
+        order = validated_data['order']
+        primary = validated_data.get('primary')
+        images = Image.objects.filter(product=product)
+        # khóa ảnh của sản phẩm rồi kiểm tra lại: ảnh có thể bị thêm / xóa sau validate()
+        current = set(images.select_for_update().values_list('id', flat=True))
+        if set(order) != current:
+            raise serializers.ValidationError({"order": "Phải gồm đúng toàn bộ ảnh của sản phẩm."})
+        if primary is not None and primary not in current:
+            raise serializers.ValidationError({"primary": "Ảnh không thuộc sản phẩm này."})
+        images.update(position=Case(
+            *[When(id=image_id, then=Value(index)) for index, image_id in enumerate(order)],
+            # ảnh chèn vào sau khi khóa (không có trong order) giữ nguyên vị trí, không bị NULL
+            default=F('position'),
+            output_field=IntegerField(),
+        ))
+        if primary is not None:
+            images.update(is_primary=Case(When(id=primary, then=Value(True)), default=Value(False)))
+        # update() không phát post_save => báo client 1 event cho cả gallery
+        bump_catalog_version_on_commit()
+        broadcast_utils("images", {
+            "type": "IMAGES_REORDERED",
+            "product_id": product.id,
+            "order": order,
+            "primary_id": primary,
+        })
+        return Image.objects.filter(product=product).order_by('position', 'id')
+
+class ProductSerializer(FieldProjectionMixin, serializers.ModelSerializer):
+    # FileField: không buffer / decode ảnh bằng Pillow, stage_upload kiểm tra header khi đọc stream
+    image = serializers.FileField(required=False, write_only=True)
     # ------
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ('id', 'name', 'description', 'image', 'image_url', 'price', 'category', 'category_name', 'created_at', 'updated_at', 'status', 'is_menu_active')
+        fields = ('id', 'name', 'description', 'image', 'image_url', 'image_variants', 'price', 'category', 'category_name', 'created_at', 'updated_at', 'status', 'is_menu_active')
         read_only_fields = ('id', 'created_at', 'updated_at')
+        projection_sources = {
+            'image_url': [],
+            'image_variants': [],
+            'category_name': ['category', 'category__name'],
+        }
+    @classmethod
+    def setup_eager_loading(cls, queryset, field_names=None):
+        """
+        Nạp trước category và ảnh chính cho danh sách sản phẩm,
+        số query cố định dù menu có bao nhiêu món.
+        field_names (đã chọn qua ?fields/?omit) => chỉ SELECT các cột cần thiết.
+        """
+        if field_names is not None:
+            queryset = queryset.only(*cls.projected_columns(field_names))
+        if field_names is None or 'category_name' in field_names:
+            queryset = queryset.select_related('category')
+        if field_names is None or {'image_url', 'image_variants'} & set(field_names):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'images',
+                    queryset=Image.objects.filter(is_primary=True).order_by('id'),
+                    to_attr='primary_images',
+                )
+            )
+        return queryset
     # ------
+    def _primary_image(self, obj):
+        # ưu tiên dữ liệu đã prefetch (ProductViewSet.get_queryset) để tránh N+1 query
+        if hasattr(obj, 'primary_images'):
+            return obj.primary_images[0] if obj.primary_images else None
+        if not hasattr(obj, '_primary_image_cache'):
+            # image_url + image_variants dùng chung 1 query
+            obj._primary_image_cache = Image.objects.filter(product=obj, is_primary=True).first()
+        return obj._primary_image_cache
     def get_image_url(self, obj):
-        primary_image = Image.objects.filter(product=obj, is_primary=True).first()
+        primary_image = self._primary_image(obj)
         if not primary_image or not primary_image.image:
             return None
         return build_cloudinary_url(primary_image.image)
+    def get_image_variants(self, obj):
+        primary_image = self._primary_image(obj)
+        if not primary_image:
+            return None
+        return build_image_variants(primary_image.image)
     def get_category_name(self, obj):
-        if obj.category:
+        if obj.category_id:
             return obj.category.name
         return None
     # ------
@@ -162,10 +389,13 @@ class ProductSerializer(serializers.ModelSerializer):
         image = validated_data.pop('image', None)
         product = Product.objects.create(**validated_data)
         if image:
-            image.seek(0)
-            image_hash = hash_image(image)
-            upload_result = cloudinary.uploader.upload(image)
-            Image.objects.create(product=product, is_primary=True, image=upload_result['public_id'], image_hash=image_hash)
+            staged = stage_image_or_error(image)
+            # ảnh chính upload ở worker nền sau commit, request trả về ngay
+            primary_image = Image.objects.create(
+                product=product, is_primary=True, image=None, image_hash=staged.sha256,
+                perceptual_hash=dhash(staged.path), status='pending',
+            )
+            schedule_image_upload(primary_image.id, staged.path, staged.sha256)
         return product
     # có sửa
     @transaction.atomic
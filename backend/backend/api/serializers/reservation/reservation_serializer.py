@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from api.models import Reservation, Table
 from django.utils import timezone
+from core.utils.table_status import set_table_status
 
 class ReservationSerializerAdmin(serializers.ModelSerializer):
     class Meta:
@@ -51,9 +52,7 @@ class ReservationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Bạn phải đăng nhập để đặt bàn.")
         customer = request.user
         validated_data['customer'] = customer
-        table = validated_data['table']
-        table.status = "reserved"
-        table.save()
+        set_table_status(validated_data['table'], "reserved")
         return super().create(validated_data)
     def update(self, instance, validated_data):
         request = self.context.get('request')
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from api.models import Table
 from django.db import transaction
+from api.serializers.mixins import FieldProjectionMixin
 
 
-class TableSerializer(serializers.ModelSerializer):
+class TableSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Table
         fields = ('id','number','capacity','status','is_active','created_at','updated_at')
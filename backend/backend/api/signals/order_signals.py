@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from api.models import Order
+from core.utils.kitchen import replace_order_tickets, sync_order_tickets_on_commit
+
+# ORDER => ticket bếp (ws/kitchen/)
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    if created:
+        # lúc tạo chưa có order items, CreateOrderSerializer / separate_table tự gửi ticket
+        return
+    sync_order_tickets_on_commit(instance.id)
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    order_id = instance.id
+    transaction.on_commit(lambda: replace_order_tickets(order_id, {}))
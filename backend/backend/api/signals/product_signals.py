@@ -1,14 +1,17 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from api.models import Product, Image
+from api.models import Product, Image, Category
 from core.utils.realtime import broadcast_utils
 from api.serializers import ProductSerializer, ImageSerializer
-from core.utils.cloudinary_image_utils import build_cloudinary_url
+from core.utils.cloudinary_image_utils import build_cloudinary_url, build_image_variants
+from core.utils.menu_cache import bump_catalog_version_on_commit
+from core.utils.perceptual_hash import invalidate_catalog_index_on_commit
 
 # PRODUCT
 @receiver(post_save, sender=Product)
 def product_saved(sender, created, instance, **kwargs):
     event_type = "PRODUCT_CREATED" if created else "PRODUCT_UPDATED"
+    bump_catalog_version_on_commit()
     broadcast_utils("products", {
         "type": event_type,
         "product": ProductSerializer(instance).data,
@@ -16,6 +19,7 @@ def product_saved(sender, created, instance, **kwargs):
     
 @receiver(post_delete, sender=Product)
 def product_destroyed(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
     broadcast_utils("products", {
         "type": "PRODUCT_DELETED",
         "id": instance.id,
@@ -26,22 +30,39 @@ def product_destroyed(sender, instance, **kwargs):
 @receiver(post_save, sender=Image)
 def image_saved(sender, created, instance, **kwargs):
     event_type = "IMAGE_CREATED" if created else "IMAGE_UPDATED"
+    bump_catalog_version_on_commit()
     
     # tạo URL từ Cloudinary public_id
     image_url = build_cloudinary_url(instance.image)
     
     broadcast_utils("images", {
         "type": event_type,
+        "id": instance.id,
         "product_id": instance.product.id,
         "image_url": image_url,
+        "image_variants": build_image_variants(instance.image),
         "is_primary": instance.is_primary,
+        "status": instance.status,
     })
     
 @receiver(post_delete, sender=Image)
 def image_destroyed(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
+    # BK-tree không xóa được node => dựng lại index ở mọi worker
+    invalidate_catalog_index_on_commit()
     broadcast_utils("images", {
         "type": "IMAGE_DELETED",
         "id": instance.id,
         "was_primary": True,
         "product_id": instance.product.id if instance.product else None
-    })
\ No newline at end of file
+    })
+
+
+# CATEGORY (category_name nằm trong payload menu)
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
+
+@receiver(post_delete, sender=Category)
+def category_destroyed(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
@@ -2,18 +2,27 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from api.models import Table
 from core.utils.realtime import broadcast_utils
+from core.utils.realtime_groups import table_groups
+from core.utils.table_status import remove_from_floor_on_commit, update_floor_on_commit
 from api.serializers import TableSerializer
 
 @receiver(post_save, sender=Table)
 def table_saved(sender, instance, created, **kwargs):
-    broadcast_utils("tables", {
+    data = {
         "type": "TABLE_CREATED" if created else "TABLE_UPDATED",
         "table": TableSerializer(instance).data,
-    })
+    }
+    # nhân viên nhận mọi bàn, tablet chỉ nhận bàn của mình
+    for group_name in table_groups(instance.id):
+        broadcast_utils(group_name, data)
+    update_floor_on_commit(instance)
 
 @receiver(post_delete, sender=Table)
 def table_deleted(sender, instance, **kwargs):
-    broadcast_utils("tables", {
+    data = {
         "type": "TABLE_DELETED",
         "id": instance.id,
-    })
\ No newline at end of file
+    }
+    for group_name in table_groups(instance.id):
+        broadcast_utils(group_name, data)
+    remove_from_floor_on_commit(instance.id)
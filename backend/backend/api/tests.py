@@ -1,3 +1,899 @@
-from django.test import TestCase
+import base64
+import io
+import itertools
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import DecimalField
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Category, Product, Image, Table, Order, OrderItem, User, Cart, CartItem
+from api.serializers import CreateOrderSerializer
+
+# header PNG 1x1 hợp lệ (stage_upload chỉ đọc kích thước từ header)
+PNG_BYTES = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00'
+
+
+class ProductListQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Món chính')
+
+    def _create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Món {Product.objects.count()}-{i}',
+                price=10000,
+                category=self.category,
+            )
+            Image.objects.create(product=product, image=f'img_{product.id}', is_primary=True, image_hash=f'h{product.id}')
+            Image.objects.create(product=product, image=f'alt_{product.id}', is_primary=False, image_hash=f'a{product.id}')
+
+    def _count_list_queries(self):
+        # bỏ qua menu cache để đo đúng số query khi serialize
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_list_query_count_constant(self):
+        self._create_products(2)
+        small_count, _ = self._count_list_queries()
+        self._create_products(20)
+        large_count, data = self._count_list_queries()
+
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(data), 22)
+        self.assertTrue(all(item['image_url'] for item in data))
+        self.assertTrue(all(item['category_name'] == 'Món chính' for item in data))
+
+
+class MenuCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Đồ uống')
+        self.product = Product.objects.create(name='Trà đá', price=5000, category=self.category)
+
+    def test_list_served_from_cache(self):
+        self.client.get('/api/products/', {'sort': 'newest'})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', {'sort': 'newest'})
+        self.assertEqual(response.json()[0]['name'], 'Trà đá')
+
+    def test_product_save_invalidates_cache(self):
+        self.client.get('/api/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Trà chanh'
+            self.product.save()
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.json()[0]['name'], 'Trà chanh')
+
+    def test_filter_by_category_cached_per_category(self):
+        other = Category.objects.create(name='Tráng miệng')
+        Product.objects.create(name='Chè', price=15000, category=other)
+        first = self.client.get('/api/products/product_filter/', {'category_id': self.category.id})
+        second = self.client.get('/api/products/product_filter/', {'category_id': other.id})
+        self.assertEqual(first.json()[0]['name'], 'Trà đá')
+        self.assertEqual(second.json()[0]['name'], 'Chè')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Lẩu')
+        Product.objects.create(name='Lẩu thái', price=200000, category=self.category)
+        self.table = Table.objects.create(number=1, capacity=4)
+
+    def _assert_not_modified(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+        return etag
+
+    def test_product_list_etag(self):
+        etag = self._assert_not_modified('/api/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Lẩu nấm', price=150000, category=self.category)
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_category_list_etag(self):
+        etag = self._assert_not_modified('/api/categories')
+        Category.objects.create(name='Nướng')
+        response = self.client.get('/api/categories', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_available_tables_etag(self):
+        etag = self._assert_not_modified('/api/tables/available/')
+        self.table.status = 'occupied'
+        self.table.save(update_fields=['status'])
+        response = self.client.get('/api/tables/available/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Món nước')
+        Product.objects.create(name='Bún bò Huế', description='Cay nồng', price=45000, category=category)
+        Product.objects.create(name='Phở bò', description='Nước dùng hầm xương', price=50000, category=category)
+        Product.objects.create(name='Cơm tấm', description='Sườn nướng', price=40000, category=category)
+
+    def _search(self, term):
+        return [item['name'] for item in self.client.get('/api/products/', {'search': term}).json()]
+
+    def test_search_ignores_diacritics(self):
+        self.assertEqual(self._search('pho'), ['Phở bò'])
+        self.assertEqual(self._search('SUON NUONG'), ['Cơm tấm'])
+
+    def test_search_ranks_prefix_match_first(self):
+        Product.objects.create(name='Bò lúc lắc', price=90000, category=Category.objects.get())
+        self.assertEqual(self._search('bo'), ['Bò lúc lắc', 'Bún bò Huế', 'Phở bò'])
+
+    def test_search_text_updated_on_save(self):
+        product = Product.objects.get(name='Cơm tấm')
+        product.name = 'Cơm gà'
+        product.save(update_fields=['name'])
+        product.refresh_from_db()
+        self.assertTrue(product.search_text.startswith('com ga'))
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Khai vị')
+        for i in range(5):
+            Product.objects.create(name=f'Gỏi {i}', price=10000 * (i % 2 + 1), category=self.category)
+
+    def _collect(self, params):
+        names, cursor = [], None
+        while True:
+            query = dict(params, page_size=2)
+            if cursor:
+                query['cursor'] = cursor
+            body = self.client.get('/api/products/', query).json()
+            self.assertLessEqual(len(body['results']), 2)
+            names += [item['name'] for item in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                return names
+
+    def test_walks_all_pages_without_duplicates(self):
+        names = self._collect({})
+        self.assertEqual(names, [f'Gỏi {i}' for i in reversed(range(5))])
+
+    def test_ties_on_sort_key_are_stable(self):
+        names = self._collect({'sort': 'price_asc'})
+        self.assertEqual(names, ['Gỏi 0', 'Gỏi 2', 'Gỏi 4', 'Gỏi 1', 'Gỏi 3'])
+
+    def test_unpaginated_without_params(self):
+        self.assertEqual(len(self.client.get('/api/products/').json()), 5)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/products/', {'cursor': 'xxx'}).status_code, 404)
+
+    def test_forged_cursor_value(self):
+        forged = base64.urlsafe_b64encode(json.dumps(['notadate', 1]).encode()).decode()
+        self.assertEqual(self.client.get('/api/products/', {'cursor': forged}).status_code, 404)
+        self.assertEqual(self.client.get('/api/products/', {'cursor': forged, 'search': 'goi'}).status_code, 404)
+
+    def test_search_pages_keep_relevance_order(self):
+        Product.objects.create(name='Món gỏi', price=10000, category=self.category)
+        names = self._collect({'search': 'goi'})
+        # khớp đầu chuỗi xếp trước, món khớp giữa chuỗi (tạo sau cùng) nằm cuối
+        self.assertEqual(names, [f'Gỏi {i}' for i in reversed(range(5))] + ['Món gỏi'])
+
+
+    def test_trigram_rank_cursor_round_trips_exactly(self):
+        from api.pagination import KeysetPagination
+        from core.utils.search import search_products
+
+        with mock.patch('core.utils.search.connection') as fake:
+            fake.vendor = 'postgresql'
+            queryset = search_products(Product.objects.all(), 'goi')
+        paginator = KeysetPagination(ordering='-search_rank')
+        field = paginator.get_ordering_field(queryset)
+        # similarity float4 được cast sang numeric => cursor giữ đúng giá trị DB so sánh
+        self.assertIsInstance(field, DecimalField)
+        row = mock.Mock(search_rank=Decimal('0.428571'), pk=7)
+        request = mock.Mock(query_params={'cursor': paginator.encode_cursor(row)})
+        self.assertEqual(paginator.decode_cursor(request, field), (Decimal('0.428571'), 7))
+
+    @skipUnless(connection.vendor == 'postgresql', 'cần pg_trgm')
+    def test_trigram_search_ties_are_not_dropped_between_pages(self):
+        names = self._collect({'search': 'goi'})
+        # 5 món cùng điểm similarity => phải đi đủ 5 món qua các trang
+        self.assertEqual(sorted(names), [f'Gỏi {i}' for i in range(5)])
+
+class AdminOrderListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', role='admin'))
+        self.category = Category.objects.create(name='Nướng')
+        self.products = [
+            Product.objects.create(name=f'Xiên {i}', price=20000, category=self.category) for i in range(3)
+        ]
+
+    def _create_orders(self, count, status='preparing'):
+        for _ in range(count):
+            table = Table.objects.create(number=Table.objects.count() + 1, capacity=4)
+            order = Order.objects.create(table=table, total_amount=60000, status=status)
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def _count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/admin/orders', params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_constant(self):
+        self._create_orders(2)
+        small_count, _ = self._count_queries()
+        self._create_orders(10)
+        large_count, data = self._count_queries()
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(data), 12)
+        self.assertEqual(len(data[0]['items']), 3)
+
+    def test_filters(self):
+        self._create_orders(2)
+        self._create_orders(1, status='paid')
+        _, paid = self._count_queries({'status': 'paid'})
+        self.assertEqual(len(paid), 1)
+        today = timezone.localdate().isoformat()
+        _, today_orders = self._count_queries({'date_from': today, 'date_to': today})
+        self.assertEqual(len(today_orders), 3)
+        _, by_table = self._count_queries({'table': Order.objects.get(pk=paid[0]['id']).table_id})
+        self.assertEqual(len(by_table), 1)
+        response = self.client.get('/api/admin/orders', {'date_from': '2026-13-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/admin/orders', {'table': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CreateOrderTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Cơm')
+
+    def _place_order(self, item_count):
+        table = Table.objects.create(number=Table.objects.count() + 1, capacity=4)
+        cart = Cart.objects.create(table=table)
+        items = []
+        for i in range(item_count):
+            product = Product.objects.create(name=f'Cơm {table.number}-{i}', price=30000, category=self.category)
+            items.append(CartItem.objects.create(cart=cart, product=product, quantity=2))
+        serializer = CreateOrderSerializer(data={'table': table.id, 'cartitems': [{'id': item.id} for item in items]})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            order = serializer.save()
+        return order, len(ctx.captured_queries)
+
+    def test_query_count_constant(self):
+        _, small_count = self._place_order(2)
+        order, large_count = self._place_order(8)
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(order.order_items.count(), 8)
+        self.assertEqual(order.total_amount, 8 * 2 * 30000)
+        self.assertFalse(CartItem.objects.filter(cart__table=order.table).exists())
+
+
+class OrderIdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.table = Table.objects.create(number=1, capacity=4)
+        cart = Cart.objects.create(table=self.table)
+        product = Product.objects.create(name='Bia', price=20000, category=Category.objects.create(name='Bia'))
+        self.item = CartItem.objects.create(cart=cart, product=product, quantity=3)
+        self.payload = {'table': self.table.id, 'cartitems': [{'id': self.item.id}]}
+
+    def test_retry_with_same_key_is_replayed(self):
+        first = self.client.post('/api/orders', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.client.post('/api/orders', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_key_different_payload(self):
+        self.client.post('/api/orders', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post('/api/orders', {'table': self.table.id, 'cartitems': [{'id': 999}]}, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 422)
+
+    def test_second_order_for_locked_cart_conflicts(self):
+        self.client.post('/api/orders', self.payload, format='json')
+        response = self.client.post('/api/orders', self.payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class FieldProjectionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Bếp')
+        product = Product.objects.create(name='Canh chua', description='x' * 500, price=30000, category=category)
+        Image.objects.create(product=product, image='canh', is_primary=True, image_hash='c')
+        Table.objects.create(number=1, capacity=2)
+
+    def test_product_fields(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/products/', {'fields': 'id,name,is_menu_active'}).json()
+        self.assertEqual(set(data[0]), {'id', 'name', 'is_menu_active'})
+        # chỉ 1 query, không SELECT description, không JOIN category / prefetch ảnh
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+
+    def test_product_omit(self):
+        data = self.client.get('/api/products/', {'omit': 'description,created_at,updated_at'}).json()
+        self.assertNotIn('description', data[0])
+        self.assertEqual(data[0]['category_name'], 'Bếp')
+        self.assertTrue(data[0]['image_url'])
+
+    def test_table_fields(self):
+        data = self.client.get('/api/tables/', {'fields': 'id,number,status'}).json()
+        self.assertEqual(set(data[0]), {'id', 'number', 'status'})
+        full = self.client.get('/api/tables/available/')
+        narrow = self.client.get('/api/tables/available/', {'fields': 'id'})
+        self.assertNotEqual(full['ETag'], narrow['ETag'])
+        self.assertEqual(narrow.json(), [{'id': Table.objects.get().id}])
+
+
+    def test_unknown_field_names_are_rejected(self):
+        response = self.client.get('/api/products/', {'fields': 'id,bogus,nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': 'Field không tồn tại: bogus, nope'})
+        response = self.client.get('/api/tables/available/', {'omit': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('omit', response.json())
+
+class MenuSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        drinks = Category.objects.create(name='Đồ uống')
+        Category.objects.create(name='Trống')
+        coffee = Product.objects.create(name='Cà phê', price=25000, category=drinks)
+        Image.objects.create(product=coffee, image='coffee', is_primary=True, image_hash='cf')
+        Product.objects.create(name='Sinh tố', price=30000, category=drinks, is_menu_active=False)
+        Product.objects.create(name='Nước cam', price=30000, category=drinks, status='unavailable')
+
+    def test_snapshot_contents(self):
+        response = self.client.get('/api/menu/snapshot')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([category['name'] for category in data], ['Đồ uống'])
+        products = data[0]['products']
+        self.assertEqual([product['name'] for product in products], ['Cà phê'])
+        self.assertTrue(products[0]['image_url'])
+
+    def test_snapshot_served_from_cache_until_catalog_changes(self):
+        etag = self.client.get('/api/menu/snapshot')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/menu/snapshot').status_code, 200)
+        self.assertEqual(self.client.get('/api/menu/snapshot', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='Sinh tố').get().save()
+        response = self.client.get('/api/menu/snapshot', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(IMAGE_UPLOAD_BACKGROUND=False, IMAGE_UPLOAD_RETRY_BACKOFF=0)
+class BackgroundImageUploadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', role='admin'))
+        self.product = Product.objects.create(name='Gà nướng', price=120000, category=Category.objects.create(name='Gà'))
+
+    def _upload(self, content=None):
+        content = content or PNG_BYTES
+        return self.client.post(
+            f'/api/products/{self.product.id}/images',
+            {'image': SimpleUploadedFile('ga.jpg', content, content_type='image/jpeg'), 'is_primary': True},
+            format='multipart',
+        )
+
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload', return_value={'public_id': 'ga_nuong'})
+    def test_create_returns_pending_then_uploads_after_commit(self, upload):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self._upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'pending')
+        upload.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        image = Image.objects.get(pk=response.json()['id'])
+        self.assertEqual(image.status, 'ready')
+        self.assertEqual(str(image.image), 'ga_nuong')
+        upload.assert_called_once()
+
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload', side_effect=ConnectionError('offline'))
+    def test_failed_upload_is_retried_then_marked_failed(self, upload):
+        with self.assertLogs('core.utils.image_ingest', level='WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._upload()
+        self.assertEqual(Image.objects.get(pk=response.json()['id']).status, 'failed')
+        self.assertEqual(upload.call_count, 4)
+
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.destroy')
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload')
+    def test_overlapping_updates_destroy_each_replaced_asset_once(self, upload, destroy):
+        image = Image.objects.create(product=self.product, image='goc', image_hash='goc', status='ready')
+        url = f'/api/products/{self.product.id}/images/{image.id}'
+        callbacks = []
+        for name in ('a', 'b'):
+            with self.captureOnCommitCallbacks(execute=False) as captured:
+                response = self.client.put(
+                    url, {'image': SimpleUploadedFile(f'{name}.png', PNG_BYTES + name.encode(), content_type='image/png')},
+                    format='multipart',
+                )
+            self.assertEqual(response.status_code, 200)
+            callbacks.append([callback for callback in captured])
+
+        # worker của lần sửa sau xong trước, worker của lần sửa đầu xong sau
+        for name, captured in (('b', callbacks[1]), ('a', callbacks[0])):
+            upload.return_value = {'public_id': name}
+            for callback in captured:
+                callback()
+
+        image.refresh_from_db()
+        self.assertEqual((str(image.image), image.status), ('b', 'ready'))
+        self.assertEqual(sorted(call.args[0] for call in destroy.call_args_list), ['a', 'goc'])
+
+    def test_failed_upload_can_be_retried(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(IMAGE_UPLOAD_TMP_DIR=directory):
+            with mock.patch('core.utils.image_storage.cloudinary.uploader.upload', side_effect=ConnectionError('offline')):
+                with self.assertLogs('core.utils.image_ingest', level='WARNING'):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        image_id = self._upload().json()['id']
+            self.assertEqual(Image.objects.get(pk=image_id).status, 'failed')
+            retained = os.path.join(directory, 'failed', str(image_id))
+            self.assertTrue(os.path.exists(retained))
+
+            with mock.patch('core.utils.image_storage.cloudinary.uploader.upload', return_value={'public_id': 'ga_nuong'}):
+                call_command('retry_failed_images', stdout=io.StringIO())
+            image = Image.objects.get(pk=image_id)
+            self.assertEqual((str(image.image), image.status), ('ga_nuong', 'ready'))
+            self.assertFalse(os.path.exists(retained))
+
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload')
+    def test_non_image_upload_is_rejected(self, upload):
+        response = self._upload(b'fake-image-bytes')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+        self.assertFalse(Image.objects.exists())
+        upload.assert_not_called()
+
+
+class NearDuplicateImageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', role='admin'))
+        category = Category.objects.create(name='Gà')
+        self.product = Product.objects.create(name='Gà nướng', price=120000, category=category)
+        self.other = Product.objects.create(name='Gà chiên', price=100000, category=category)
+
+    def _photo(self, size, image_format):
+        from core.tests import save_sample_photo
+
+        path = os.path.join(tempfile.mkdtemp(), 'photo')
+        save_sample_photo(path, size, image_format)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _upload(self, product, content):
+        with self.captureOnCommitCallbacks(execute=False):
+            return self.client.post(
+                f'/api/products/{product.id}/images',
+                {'image': SimpleUploadedFile('ga.jpg', content), 'is_primary': False},
+                format='multipart',
+            )
+
+    @override_settings(IMAGE_NEAR_DUPLICATE_MODE='reject')
+    def test_resized_copy_rejected_across_catalog(self):
+        first = self._upload(self.product, self._photo((256, 256), 'PNG'))
+        self.assertEqual(first.status_code, 201)
+        self.assertIsNotNone(Image.objects.get(pk=first.json()['id']).perceptual_hash)
+
+        response = self._upload(self.other, self._photo((100, 100), 'JPEG'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(first.json()['id']), str(response.json()['image']))
+        self.assertEqual(Image.objects.count(), 1)
+
+    @override_settings(IMAGE_NEAR_DUPLICATE_MODE='warn')
+    def test_warn_mode_creates_and_reports(self):
+        first = self._upload(self.product, self._photo((256, 256), 'PNG'))
+        response = self._upload(self.other, self._photo((100, 100), 'JPEG'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['id'] for item in response.json()['near_duplicates']], [first.json()['id']])
+        self.assertNotIn('near_duplicates', first.json())
+
+    def test_index_updated_incrementally_and_rebuilt_on_delete(self):
+        from core.utils import perceptual_hash
+
+        first = Image.objects.create(product=self.product, image='a', image_hash='h1', perceptual_hash='00000000000000ff')
+        tree = perceptual_hash.get_catalog_index()
+        generation = perceptual_hash._index['generation']
+
+        # ảnh mới + lưu trạng thái ảnh cũ (pending -> ready) => không dựng lại tree
+        Image.objects.create(product=self.other, image='b', image_hash='h2', perceptual_hash='00000000000000fe')
+        first.status = 'ready'
+        first.save(update_fields=['status', 'updated_at'])
+        self.assertIs(perceptual_hash.get_catalog_index(), tree)
+        self.assertEqual(perceptual_hash._index['generation'], generation)
+        self.assertEqual(len(perceptual_hash.find_near_duplicates('00000000000000ff', 1)), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertIsNot(perceptual_hash.get_catalog_index(), tree)
+        self.assertEqual(len(perceptual_hash.find_near_duplicates('00000000000000ff', 1)), 1)
+
+    @override_settings(IMAGE_NEAR_DUPLICATE_MODE='warn', IMAGE_UPLOAD_BACKGROUND=False)
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload', side_effect=lambda path: {'public_id': os.path.basename(path)})
+    def test_bulk_catches_near_duplicates_within_batch(self, upload):
+        files = [
+            SimpleUploadedFile('big.png', self._photo((256, 256), 'PNG')),
+            SimpleUploadedFile('small.jpg', self._photo((100, 100), 'JPEG')),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/products/{self.product.id}/images/bulk', {'images': files}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['name'] for item in response.json()['near_duplicates']['small.jpg']], ['big.png'])
+
+
+
+class ImageVariantTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Gà nướng', price=120000, category=Category.objects.create(name='Gà'))
+        self.image = Image.objects.create(product=self.product, image='menu/ga_nuong', is_primary=True, image_hash='h1')
+
+    def test_product_and_image_share_variants(self):
+        from core.utils.cloudinary_image_utils import build_variant_url
+
+        build_variant_url.cache_clear()
+        product = self.client.get('/api/products/').json()[0]
+        variants = product['image_variants']
+        self.assertIn('c_fill,f_auto,g_auto,h_160,q_auto,w_160', variants['thumb'])
+        self.assertTrue(variants['card'].startswith('https://'))
+        self.assertEqual(variants['srcset']['webp'].count('w, '), 2)
+        self.assertIn('f_avif', variants['srcset']['avif'])
+
+        image = self.client.get(f'/api/products/{self.product.id}/images').json()[0]
+        self.assertEqual(image['image_variants'], variants)
+        self.assertTrue(image['image_url'].startswith('https://'))
+        # lần 2 chỉ đọc từ LRU
+        self.assertEqual(build_variant_url.cache_info().currsize, 9)
+        self.assertGreaterEqual(build_variant_url.cache_info().hits, 9)
+
+    def test_pending_image_has_no_variants(self):
+        Image.objects.filter(pk=self.image.pk).update(image=None, status='pending')
+        self.assertIsNone(self.client.get('/api/products/').json()[0]['image_variants'])
+
+
+def png_bytes(width, height):
+    return b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR' + width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + b'\x08\x02\x00\x00\x00'
+
+
+@override_settings(IMAGE_UPLOAD_BACKGROUND=False)
+class BulkImageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', role='admin'))
+        self.product = Product.objects.create(name='Gà nướng', price=120000, category=Category.objects.create(name='Gà'))
+
+    @mock.patch('core.utils.image_storage.cloudinary.uploader.upload', side_effect=lambda path: {'public_id': os.path.basename(path)})
+    def test_bulk_upload_dedups_and_uploads(self, upload):
+        import hashlib
+        Image.objects.create(product=self.product, image='old', image_hash=hashlib.sha256(png_bytes(5, 5)).hexdigest(), position=0)
+        files = [
+            SimpleUploadedFile('a.png', png_bytes(1, 1)),
+            SimpleUploadedFile('b.png', png_bytes(2, 2)),
+            SimpleUploadedFile('a-copy.png', png_bytes(1, 1)),
+            SimpleUploadedFile('old.png', png_bytes(5, 5)),
+            SimpleUploadedFile('note.txt', b'hello'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/products/{self.product.id}/images/bulk', {'images': files}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([image['position'] for image in body['created']], [1, 2])
+        self.assertEqual(
+            sorted((item['name'], item['reason']) for item in body['skipped']),
+            [('a-copy.png', 'duplicate'), ('note.txt', 'invalid'), ('old.png', 'duplicate')],
+        )
+        self.assertEqual(upload.call_count, 2)
+        self.assertEqual(Image.objects.filter(product=self.product, status='ready').count(), 3)
+        # sản phẩm chưa có ảnh chính => ảnh đầu tiên của batch
+        self.assertEqual(Image.objects.get(is_primary=True).id, body['created'][0]['id'])
+
+    def test_reorder_and_set_primary_in_one_transaction(self):
+        images = [
+            Image.objects.create(product=self.product, image=f'img{i}', image_hash=f'h{i}', position=i, is_primary=i == 0)
+            for i in range(3)
+        ]
+        order = [images[2].id, images[0].id, images[1].id]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(
+                f'/api/products/{self.product.id}/images/reorder', {'order': order, 'primary': images[1].id}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image['id'] for image in response.json()], order)
+        self.assertEqual([image['is_primary'] for image in response.json()], [False, False, True])
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "api_image"') for query in ctx.captured_queries), 2)
+
+        response = self.client.put(
+            f'/api/products/{self.product.id}/images/reorder', {'order': order[:2]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_reorder_rechecks_images_added_after_validation(self):
+        from rest_framework.exceptions import ValidationError
+        from api.serializers import ImageReorderSerializer
+
+        images = [Image.objects.create(product=self.product, image=f'img{i}', image_hash=f'h{i}', position=i) for i in range(2)]
+        serializer = ImageReorderSerializer(data={'order': [images[1].id, images[0].id]}, context={'product': self.product})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        added = Image.objects.create(product=self.product, image='img2', image_hash='h2', position=2)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertEqual(
+            list(Image.objects.order_by('id').values_list('id', 'position')),
+            [(images[0].id, 0), (images[1].id, 1), (added.id, 2)],
+        )
+
+@override_settings(REALTIME_BACKGROUND_SENDER=False)
+class KitchenTicketTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.grill = Category.objects.create(name='Nướng')
+        self.drinks = Category.objects.create(name='Đồ uống')
+        self.table = Table.objects.create(number=7, capacity=4)
+        cart = Cart.objects.create(table=self.table)
+        self.items = [
+            CartItem.objects.create(cart=cart, product=Product.objects.create(name=name, price=50000, category=category), quantity=1)
+            for name, category in (('Sườn nướng', self.grill), ('Gà nướng', self.grill), ('Trà đá', self.drinks))
+        ]
+
+    def _place_order(self):
+        serializer = CreateOrderSerializer(data={'table': self.table.id, 'cartitems': [{'id': item.id} for item in self.items]})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with mock.patch('core.utils.kitchen.broadcast_utils') as broadcast:
+            with self.captureOnCommitCallbacks(execute=True):
+                order = serializer.save()
+        return order, broadcast
+
+    def test_order_split_into_station_tickets(self):
+        from core.utils.kitchen import kitchen_snapshot, station_group
+
+        order, broadcast = self._place_order()
+        grill = kitchen_snapshot(self.grill.id)
+        self.assertEqual(len(grill), 1)
+        self.assertEqual([item['name'] for item in grill[0]['items']], ['Sườn nướng', 'Gà nướng'])
+        self.assertEqual(grill[0]['table_number'], 7)
+        self.assertEqual(len(kitchen_snapshot()), 2)
+
+        groups = sorted(call.args[0] for call in broadcast.call_args_list)
+        self.assertEqual(groups, sorted(['kitchen', 'kitchen', station_group(self.grill.id), station_group(self.drinks.id)]))
+        self.assertEqual({call.args[1]['type'] for call in broadcast.call_args_list}, {'TICKET_CREATED'})
+
+    def test_paid_order_closes_tickets(self):
+        from core.utils.kitchen import kitchen_snapshot
+
+        order, _ = self._place_order()
+        order.status = 'paid'
+        with mock.patch('core.utils.kitchen.broadcast_utils') as broadcast:
+            with self.captureOnCommitCallbacks(execute=True):
+                order.save()
+        self.assertEqual(kitchen_snapshot(), [])
+        self.assertEqual({call.args[1]['type'] for call in broadcast.call_args_list}, {'TICKET_CLOSED'})
+
+    def test_board_rebuilt_from_db_when_cache_lost(self):
+        from core.utils.kitchen import kitchen_snapshot
+
+        self._place_order()
+        cache.clear()
+        self.assertEqual(len(kitchen_snapshot()), 2)
+
+
+@override_settings(REALTIME_BACKGROUND_SENDER=False)
+class OrderItemTransitionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='chef', password='x', role='chef'))
+        category = Category.objects.create(name='Bếp nóng')
+        table = Table.objects.create(number=3, capacity=4)
+        cart = Cart.objects.create(table=table)
+        items = [
+            CartItem.objects.create(cart=cart, product=Product.objects.create(name=f'Món {i}', price=40000, category=category), quantity=1)
+            for i in range(3)
+        ]
+        serializer = CreateOrderSerializer(data={'table': table.id, 'cartitems': [{'id': item.id} for item in items]})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = serializer.save()
+        self.item_ids = list(self.order.order_items.order_by('id').values_list('id', flat=True))
+
+    def _transition(self, ids, target):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/kitchen/items/transition', {'items': ids, 'status': target}, format='json')
+
+    def test_bulk_transition_single_update_and_incremental_counts(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._transition(self.item_ids[:2], 'ready')
+        self.assertEqual(response.status_code, 200)
+        item_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_orderitem"')]
+        self.assertEqual(len(item_updates), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.item_status_counts, {'pending': 1, 'ready': 2})
+        self.assertEqual(self.order.status, 'preparing')
+
+        from core.utils.kitchen import kitchen_snapshot
+        statuses = [item['status'] for item in kitchen_snapshot()[0]['items']]
+        self.assertEqual(statuses, ['ready', 'ready', 'pending'])
+
+    def test_invalid_transition_rejected_atomically(self):
+        self._transition(self.item_ids[:1], 'ready')
+        response = self._transition(self.item_ids, 'preparing')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            list(OrderItem.objects.filter(id__in=self.item_ids).order_by('id').values_list('status', flat=True)),
+            ['ready', 'pending', 'pending'],
+        )
+
+    def test_order_served_when_all_items_served(self):
+        from core.utils.kitchen import kitchen_snapshot
+
+        self._transition(self.item_ids, 'ready')
+        self._transition(self.item_ids[:2], 'served')
+        self._transition(self.item_ids[2:], 'served')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'served')
+        self.assertEqual(self.order.item_status_counts, {'served': 3})
+        self.assertEqual(kitchen_snapshot(), [])
+
+    def test_order_cancelled_when_all_items_cancelled(self):
+        from core.utils.kitchen import kitchen_snapshot
+
+        self._transition(self.item_ids[:1], 'cancelled')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 80000)
+        self._transition(self.item_ids[1:], 'cancelled')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertEqual(self.order.item_status_counts, {'cancelled': 3})
+        self.assertEqual(self.order.total_amount, 0)
+        self.assertEqual(kitchen_snapshot(), [])
+        # không tạo QR thanh toán cho order đã hủy
+        response = self.client.post('/api/sepay/create/', {'order_id': self.order.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.order.payments.exists())
+
+    def test_served_unpaid_order_can_still_be_split(self):
+        self._transition(self.item_ids, 'ready')
+        self._transition(self.item_ids, 'served')
+        target = Table.objects.create(number=4, capacity=2)
+        existing = Order.objects.create(table=target, total_amount=0, status='served', item_status_counts={})
+        cashier = APIClient()
+        cashier.force_authenticate(User.objects.create_user(username='cashier', password='x', role='cashier'))
+        for item_id in self.item_ids[:2]:
+            response = cashier.put('/api/cashier/seperateorder/', {
+                'table_id': self.order.table_id, 'new_table_id': target.id,
+                'items_to_split': [{'order_item_id': item_id, 'quantity': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+        # món gộp vào order đang mở của bàn mới, không tạo order thứ 2
+        self.assertEqual(list(target.orders.values_list('id', flat=True)), [existing.id])
+        existing.refresh_from_db()
+        self.assertEqual((existing.status, existing.item_status_counts), ('served', {'served': 2}))
+
+    def test_table_with_served_unpaid_order_cannot_be_disabled(self):
+        self._transition(self.item_ids, 'ready')
+        self._transition(self.item_ids, 'served')
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user(username='admin', password='x', role='admin'))
+        response = admin.patch(f'/api/tables/{self.order.table_id}/disable/')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Table.objects.get(pk=self.order.table_id).is_active)
+
+    def test_customer_cannot_transition(self):
+        self.client.force_authenticate(User.objects.create_user(username='guest', password='x'))
+        self.assertEqual(self._transition(self.item_ids, 'ready').status_code, 403)
+
+
+@override_settings(REALTIME_BACKGROUND_SENDER=False)
+class FloorSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.small = Table.objects.create(number=1, capacity=2)
+        self.large = Table.objects.create(number=2, capacity=6)
+        self.cart = Cart.objects.create(table=self.small)
+        self.product = Product.objects.create(name='Phở', price=50000, category=Category.objects.create(name='Nước'))
+
+    def _summary(self):
+        return self.client.get('/api/tables/summary/').json()
+
+    def test_summary_updates_incrementally_without_db_reads(self):
+        self.assertEqual(self._summary()['counts'], {'available': 2, 'occupied': 0, 'reserved': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/carts', {'cart': self.cart.id, 'product': self.product.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertNumQueries(0):
+            summary = self._summary()
+        self.assertEqual(summary['counts'], {'available': 1, 'occupied': 1, 'reserved': 0})
+        self.assertEqual(summary['by_capacity']['2'], {'available': 0, 'occupied': 1, 'reserved': 0})
+
+        # cache mất => dựng lại từ DB, ra cùng kết quả
+        cache.clear()
+        rebuilt = self._summary()
+        self.assertEqual((rebuilt['counts'], rebuilt['by_capacity']), (summary['counts'], summary['by_capacity']))
+
+    def test_removing_last_cart_item_frees_table(self):
+        item = CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Table.objects.filter(pk=self.small.pk).update(status='occupied')
+            cache.clear()
+            self.client.delete(f'/api/carts/{item.id}')
+        self.small.refresh_from_db()
+        self.assertEqual(self.small.status, 'available')
+        self.assertEqual(self._summary()['counts']['available'], 2)
+
+    def test_disabled_table_leaves_summary(self):
+        self._summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.large.is_active = False
+            self.large.save()
+        summary = self._summary()
+        self.assertEqual(summary['total'], 1)
+        self.assertNotIn('6', summary['by_capacity'])
+
+    def test_contended_lock_drops_aggregate_instead_of_writing_unlocked(self):
+        from core.utils.table_status import FLOOR_LOCK_KEY, FLOOR_SUMMARY_KEY, update_floor
+
+        self._summary()
+        cache.set(FLOOR_LOCK_KEY, 'worker-khac', timeout=None)
+        Table.objects.filter(pk=self.small.pk).update(status='occupied')
+        with mock.patch('core.utils.cache_lock.time') as clock, \
+                mock.patch('core.utils.table_status.broadcast_utils') as broadcast, \
+                self.assertLogs('core.utils.cache_lock', level='WARNING'):
+            clock.monotonic.side_effect = itertools.count(0, 10)
+            update_floor(self.small.id, 'occupied', 2)
+        # không ghi aggregate khi chưa có lock, lock của worker khác giữ nguyên
+        self.assertIsNone(cache.get(FLOOR_SUMMARY_KEY))
+        self.assertEqual(cache.get(FLOOR_LOCK_KEY), 'worker-khac')
+        # client vẫn nhận số đếm lại từ DB
+        self.assertEqual(broadcast.call_args.args[1]['summary']['counts']['occupied'], 1)
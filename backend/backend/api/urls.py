@@ -17,7 +17,10 @@ from .view import (
     sepay_webhook,
     CheckPaymentStatusView,
     InvoiceViewSet,
-    UserViewSet
+    UserViewSet,
+    MenuSnapshotView,
+    KitchenViewSet,
+    RealtimeMetricsView
 )
 from .view.product.product import ProductViewSet
 from rest_framework.routers import DefaultRouter
@@ -45,6 +48,8 @@ urlpatterns = [
     path('cashier/switchorder/<int:pk>',OrderCashierViewSet.as_view({'put':'switch_table'}),name='switch-order'),
     # seperate order
     path('cashier/seperateorder/',OrderCashierViewSet.as_view({'put':'separate_table'}),name='separate-order'),
+    # menu snapshot (toàn bộ danh mục + món đang bán, 1 request)
+    path('menu/snapshot', MenuSnapshotView.as_view(), name='menu-snapshot'),
     # Categories (dùng ViewSet)
     path('categories', CreateCategoryViewSet.as_view({'get': 'list', 'post': 'create'}), name='category-list'),
     path('categories/<int:pk>', CreateCategoryViewSet.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}), name='category-detail'),
@@ -54,6 +59,8 @@ urlpatterns = [
     path('reservations/<int:pk>/cancel',ReservationViewSet.as_view({'put':'cancel'}),name='reservation-cancel'),
     # Product Images (nested route)
     path('products/<int:product_pk>/images', ImageViewSet.as_view({'get':'list','post':'create'}), name='product-images'),
+    path('products/<int:product_pk>/images/bulk', ImageViewSet.as_view({'post':'bulk_create'}), name='product-images-bulk'),
+    path('products/<int:product_pk>/images/reorder', ImageViewSet.as_view({'put':'reorder'}), name='product-images-reorder'),
     path('products/<int:product_pk>/images/<int:pk>', ImageViewSet.as_view({'get':'retrieve','put':'update','delete':'destroy'}), name='product-image-detail'),
     # cartitem
     path('carts',CartItemViewSet.as_view({'get':'list','post':'add_to_cart'})),
@@ -61,6 +68,10 @@ urlpatterns = [
     # order
     path('orders',OrderViewSet.as_view({'post':'create'})),
     path('admin/orders',AdminOrderViewSet.as_view({'get':'list_orders'})),
+    # realtime: message bị gộp / bỏ, kết nối chậm bị ngắt
+    path('admin/realtime/metrics',RealtimeMetricsView.as_view(),name='admin-realtime-metrics'),
+    # bếp: chuyển trạng thái nhiều món 1 lần
+    path('kitchen/items/transition',KitchenViewSet.as_view({'post':'transition_items'}),name='kitchen-items-transition'),
     # payment
     path('sepay/create/', CreateQRView.as_view(), name='sepay_create'),
     # check payment status
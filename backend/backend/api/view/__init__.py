@@ -10,6 +10,9 @@ from .admin.order import AdminOrderViewSet
 from .cashier.order import OrderCashierViewSet
 from .payment.payment import CreateQRView, sepay_webhook, CheckPaymentStatusView
 from .invoice.invoice import InvoiceViewSet
+from .menu.menu import MenuSnapshotView
+from .kitchen.kitchen import KitchenViewSet
+from .admin.realtime import RealtimeMetricsView
 
 # mới
 from .user.user import UserViewSet
\ No newline at end of file
@@ -4,11 +4,55 @@ from api.serializers import CreateOrderSerializer,OrderSerializer
 from rest_framework import viewsets,status
 from api.permission import IsAdminUser
 from rest_framework.decorators import action
+from api.pagination import KeysetPagination
+from api.serializers.mixins import parse_projection
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def _start_of_day(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 class AdminOrderViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
     def list_orders(self, request):
         # Logic lấy danh sách đơn hàng
-        orders = Order.objects.all()
-        serializer = OrderSerializer(orders, many=True)
+        # ?fields / ?omit => chỉ SELECT / prefetch phần cần thiết
+        field_names = OrderSerializer.select_field_names(*parse_projection(request))
+        orders = OrderSerializer.setup_eager_loading(Order.objects.all(), field_names)
+
+        # filter khoảng ngày (theo ngày địa phương, so sánh trực tiếp created_at để dùng index)
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        try:
+            if date_from:
+                orders = orders.filter(created_at__gte=_start_of_day(date_from))
+            if date_to:
+                orders = orders.filter(created_at__lt=_start_of_day(date_to) + timedelta(days=1))
+        except ValueError:
+            return Response({'error': 'Ngày không hợp lệ (YYYY-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # filter status
+        status_value = request.query_params.get('status')
+        if status_value in ['pending', 'preparing', 'served', 'paid', 'cancelled']:
+            orders = orders.filter(status=status_value)
+
+        # filter bàn
+        table_id = request.query_params.get('table')
+        if table_id:
+            try:
+                orders = orders.filter(table_id=int(table_id))
+            except ValueError:
+                return Response({'error': 'Bàn không hợp lệ.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # phân trang keyset (chỉ khi client gửi cursor/page_size)
+        paginator = KeysetPagination(ordering='-created_at')
+        page = paginator.paginate_queryset(orders, request)
+        if page is not None:
+            return paginator.get_paginated_response(OrderSerializer(page, many=True, context={'request': request}).data)
+        serializer = OrderSerializer(orders, many=True, context={'request': request})
         return Response(serializer.data,status=status.HTTP_200_OK)
\ No newline at end of file
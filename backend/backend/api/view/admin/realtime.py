@@ -0,0 +1,15 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from api.permission import IsAdminUser
+from core.utils.realtime_queue import realtime_metrics
+
+
+class RealtimeMetricsView(APIView):
+    """
+    Bộ đếm message realtime bị gộp / bị bỏ / kết nối chậm bị ngắt (cộng dồn mọi worker).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(realtime_metrics())
@@ -1,10 +1,12 @@
 from rest_framework import viewsets
 from api.permission import IsAdminUser
-from api.models import Reservation,Table
+from api.models import Reservation
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 from api.serializers import ReservationSerializerAdmin
+from api.pagination import KeysetPagination
+from core.utils.table_status import set_table_status
 
 class ReservationAdminViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminUser]
@@ -12,15 +14,18 @@ class ReservationAdminViewSet(viewsets.ModelViewSet):
     serializer_class = ReservationSerializerAdmin
     def list(self, request,*args, **kwargs):
         reservations = Reservation.objects.filter(status='pending')
+        # phân trang keyset (chỉ khi client gửi cursor/page_size)
+        paginator = KeysetPagination(ordering='-created_at')
+        page = paginator.paginate_queryset(reservations, request)
+        if page is not None:
+            return paginator.get_paginated_response(ReservationSerializerAdmin(page, many=True).data)
         serializer = ReservationSerializerAdmin(reservations, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     @action(detail=True, methods=['put'],url_path='confirm')
     def confirm_reservation(self, request, pk=None):
         try:
-            reservation = Reservation.objects.get(pk=pk)
-            table = Table.objects.get(pk=reservation.table.id)
-            table.status = 'occupied'
-            table.save()
+            reservation = Reservation.objects.select_related('table').get(pk=pk)
+            set_table_status(reservation.table, 'occupied')
             reservation.status = 'confirmed'
             reservation.save()
             return Response({'message': 'Đặt chỗ đã được xác nhận.'}, status=status.HTTP_200_OK)
@@ -29,10 +34,8 @@ class ReservationAdminViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['put'],url_path='cancel')
     def cancel_reservation(self,request,pk=None):
         try:
-            reservation = Reservation.objects.get(pk=pk)
-            table = Table.objects.get(pk=reservation.table.id)
-            table.status = "available"
-            table.save()
+            reservation = Reservation.objects.select_related('table').get(pk=pk)
+            set_table_status(reservation.table, "available")
             reservation.status = 'cancelled'
             reservation.save()
             return Response({'message': 'Đặt chỗ đã được hủy bởi quản trị viên.'}, status=status.HTTP_200_OK)
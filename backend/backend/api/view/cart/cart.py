@@ -6,6 +6,7 @@ from api.models import CartItem,Product,Table
 from rest_framework.permissions import IsAuthenticated,AllowAny
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
+from core.utils.table_status import set_table_status
 class CartItemViewSet(viewsets.ViewSet):
     # permission_classes = [IsAuthenticated]  # hoặc IsAdminUser nếu cần
 
@@ -39,12 +40,11 @@ class CartItemViewSet(viewsets.ViewSet):
             return Response({'error': 'Không tìm thấy sản phẩm.'}, status=status.HTTP_404_NOT_FOUND)
     @action(detail=True,methods=['delete'])
     def remove_cart_item(self,request,pk=None):
-        cart_item = get_object_or_404(CartItem,pk=pk)
-        table = cart_item.table
+        cart_item = get_object_or_404(CartItem.objects.select_related('cart__table'),pk=pk)
+        cart = cart_item.cart
         cart_item.delete()
-        if not CartItem.objects.filter(table=table).exists():
-            table.status="available"
-            table.save()
+        if not cart.cart_items.exists():
+            set_table_status(cart.table, "available")
         return Response(status=status.HTTP_204_NO_CONTENT)
         
 
@@ -7,6 +7,7 @@ from api.serializers import OrderSerializer
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.db.models import F
+from core.utils.table_status import set_table_status
 class OrderCashierViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -28,10 +29,8 @@ class OrderCashierViewSet(viewsets.ModelViewSet):
         # Cập nhật bàn
         old_table = order.table
         order.table = table_obj
-        old_table.status = 'available'
-        old_table.save(update_fields=['status'])
-        table_obj.status = 'occupied'
-        table_obj.save(update_fields=['status'])
+        set_table_status(old_table, 'available')
+        set_table_status(table_obj, 'occupied')
         order.save()
 
         return Response({'message': "Chuyển bàn thành công."}, status=status.HTTP_200_OK)
@@ -45,7 +44,7 @@ class OrderCashierViewSet(viewsets.ModelViewSet):
             return Response({"error": "Chưa chọn món để tách!"}, status=400)
 
         old_table = get_object_or_404(Table, pk=current_table_id)
-        old_order = old_table.orders.filter(status='preparing').first()
+        old_order = old_table.orders.filter(status__in=Order.OPEN_STATUSES).first()
 
         if not old_order:
             return Response({"error": "Bàn không có order!"}, status=400)
@@ -53,7 +52,7 @@ class OrderCashierViewSet(viewsets.ModelViewSet):
         target_table = get_object_or_404(Table, pk=target_table_id)
 
         # Lấy order bàn mới nếu có
-        new_order = Order.objects.filter(table=target_table, status='preparing').first()
+        new_order = Order.objects.filter(table=target_table, status__in=Order.OPEN_STATUSES).first()
         if not new_order:
             new_order = Order.objects.create(
                 table=target_table,
@@ -81,7 +80,8 @@ class OrderCashierViewSet(viewsets.ModelViewSet):
                 defaults={
                     'quantity': qty,
                     'price': old_item.price,
-                    'description': old_item.description
+                    'description': old_item.description,
+                    'status': old_item.status,
                 }
             )
             if not created:
@@ -95,19 +95,19 @@ class OrderCashierViewSet(viewsets.ModelViewSet):
 
         new_order.total_amount += total_split
         old_order.total_amount -= total_split
+        # món chuyển giữa 2 order => đếm lại trạng thái món của cả 2
+        new_order.refresh_item_status_counts()
+        old_order.refresh_item_status_counts()
         new_order.save()
         old_order.save()
 
-        target_table.status = 'occupied'
-        target_table.save(update_fields=['status'])
+        set_table_status(target_table, 'occupied')
 
         if old_order.order_items.exists():
-            old_table.status = 'occupied'
-            old_table.save(update_fields=['status'])
+            set_table_status(old_table, 'occupied')
         else:
             old_order.delete()
-            old_table.status = 'available'
-            old_table.save(update_fields=['status'])
+            set_table_status(old_table, 'available')
 
         return Response({
             'message': "Tách món sang bàn mới thành công."
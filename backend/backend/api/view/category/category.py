@@ -5,14 +5,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from api.serializers import CategorySerializer
 from django.shortcuts import get_object_or_404
+from core.utils.http_cache import queryset_etag, conditional_response
 
 class CreateCategoryViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
     def list(self, request):
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_response(
+            request,
+            queryset_etag(categories),
+            lambda: Response(CategorySerializer(categories, many=True).data, status=status.HTTP_200_OK),
+        )
     def update(self, request, pk=None):
         category = get_object_or_404(Category, pk=pk)
         serializer = CategorySerializer(category, data=request.data, partial=True)
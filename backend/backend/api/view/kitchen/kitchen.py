@@ -0,0 +1,23 @@
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+
+from api.permission import IsKitchenStaff
+from api.serializers import OrderItemTransitionSerializer
+
+
+class KitchenViewSet(viewsets.ViewSet):
+    permission_classes = [IsKitchenStaff]
+
+    def transition_items(self, request):
+        # {"items": [id, ...], "status": "ready"} => đổi trạng thái hàng loạt trong 1 transaction
+        serializer = OrderItemTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save()
+        return Response({
+            "status": serializer.validated_data['status'],
+            "items": sorted(set(serializer.validated_data['items'])),
+            "orders": [
+                {"id": order.id, "status": order.status, "item_status_counts": order.item_status_counts}
+                for order in orders
+            ],
+        }, status=status.HTTP_200_OK)
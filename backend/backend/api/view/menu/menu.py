@@ -0,0 +1,53 @@
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Category, Product
+from api.serializers import ProductSerializer
+from core.utils.menu_cache import get_or_build_menu_blob
+from core.utils.http_cache import build_etag, conditional_response
+
+# field món ăn cần cho màn hình gọi món
+SNAPSHOT_PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'image_url', 'image_variants', 'category')
+
+
+def build_menu_snapshot():
+    """
+    Toàn bộ menu đang bán: các danh mục có món (available + đang bật menu),
+    mỗi món kèm ảnh chính. Trả về bytes JSON đã render sẵn.
+    """
+    field_names = set(SNAPSHOT_PRODUCT_FIELDS)
+    products = ProductSerializer.setup_eager_loading(
+        Product.objects.filter(status='available', is_menu_active=True),
+        field_names,
+    ).order_by('name', 'id')
+    categories = Category.objects.prefetch_related(
+        Prefetch('products', queryset=products, to_attr='menu_products')
+    ).order_by('name', 'id')
+
+    data = [
+        {
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'products': ProductSerializer(category.menu_products, many=True, fields=SNAPSHOT_PRODUCT_FIELDS).data,
+        }
+        for category in categories
+        if category.menu_products
+    ]
+    return JSONRenderer().render(data)
+
+
+class MenuSnapshotView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        # blob dựng 1 lần cho mỗi version menu (signals bump version khi menu đổi)
+        version, blob = get_or_build_menu_blob('snapshot', build_menu_snapshot)
+        return conditional_response(
+            request,
+            build_etag('menu-snapshot', version),
+            lambda: HttpResponse(blob, content_type='application/json'),
+        )
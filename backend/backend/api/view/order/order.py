@@ -4,12 +4,20 @@ from api.serializers import CreateOrderSerializer,OrderSerializer
 from rest_framework import viewsets,status
 from api.permission import IsAdminUser
 from rest_framework.decorators import action
+from django.db import transaction
+from core.utils.idempotency import idempotent_response
 
 class OrderViewSet(viewsets.ViewSet):
 
     def create(self,request):
-        serializer = CreateOrderSerializer(data=request.data,context={'request':request})
-        if serializer.is_valid():
-            order = serializer.save()
-            return Response(OrderSerializer(order).data,status=status.HTTP_201_CREATED)
+        # tablet retry do mạng yếu => gửi kèm Idempotency-Key để không tạo đơn trùng
+        return idempotent_response(request, 'orders', lambda: self._create_order(request))
+
+    def _create_order(self, request):
+        # validate + save trong cùng transaction để giữ lock cart (select_for_update)
+        with transaction.atomic():
+            serializer = CreateOrderSerializer(data=request.data,context={'request':request})
+            if serializer.is_valid():
+                order = serializer.save()
+                return Response(OrderSerializer(order).data,status=status.HTTP_201_CREATED)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
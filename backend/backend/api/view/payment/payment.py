@@ -28,6 +28,8 @@ class CreateQRView(APIView):
 
         if order.status == "paid":
             return Response({"error": "Đơn hàng đã được thanh toán!"}, status=400)
+        if order.status == "cancelled":
+            return Response({"error": "Đơn hàng đã bị hủy!"}, status=400)
 
         # Tạo mã giao dịch duy nhất (rất quan trọng để tránh trùng)
         transaction_code = f"SEVQR OD{order.id}"
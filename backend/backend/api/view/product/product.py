@@ -2,46 +2,83 @@ from rest_framework import viewsets
 from api.permission import IsAdminOrReadOnly
 from api.models import Product, Image, Category
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated,AllowAny
+from rest_framework.permissions import IsAuthenticated,AllowAny,SAFE_METHODS
 from rest_framework import status
-from api.serializers import ProductSerializer,ImageSerializer
+from api.serializers import ProductSerializer,ImageSerializer,BulkImageUploadSerializer,ImageReorderSerializer
 from rest_framework.decorators import action,permission_classes
 from django.shortcuts import get_object_or_404
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from django.db.models import Q
+from core.utils.menu_cache import get_or_build_menu_payload, build_menu_cache_key
+from core.utils.http_cache import build_etag, conditional_response
+from core.utils.search import search_products
+from api.pagination import KeysetPagination
+from api.serializers.mixins import parse_projection
+
+# các query param ảnh hưởng tới kết quả list => dùng làm cache key
+PRODUCT_LIST_PARAMS = ('search', 'category', 'status', 'min_price', 'max_price', 'sort', 'cursor', 'page_size', 'fields', 'omit')
+# sort => field dùng cho order_by và keyset pagination
+PRODUCT_SORT_ORDERING = {
+    'newest': '-created_at',
+    'price_asc': 'price',
+    'price_desc': '-price',
+}
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def get_queryset(self):
+        # nạp trước category + ảnh chính => số query không phụ thuộc số món
+        # ?fields / ?omit => chỉ SELECT các cột cần cho các field được chọn
+        field_names = None
+        if self.request.method in SAFE_METHODS:
+            field_names = ProductSerializer.select_field_names(*parse_projection(self.request))
+        return ProductSerializer.setup_eager_loading(super().get_queryset(), field_names)
+
     @action(detail=False, methods=['get'], url_path='product_filter')
     def get_product_by_category(self, request):
         category_id = request.query_params.get('category_id')
         if not category_id:
             return Response({'error': 'Thiếu category_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-        category = get_object_or_404(Category, pk=category_id)
-        products = Product.objects.filter(category=category)
+        def build_payload():
+            category = get_object_or_404(Category, pk=category_id)
+            products = self.get_queryset().filter(category=category)
+            return list(ProductSerializer(products, many=True, context={'request': request}).data)
 
-        if not products.exists():
-            return Response({'error': 'Không có sản phẩm nào trong danh mục này'}, status=status.HTTP_404_NOT_FOUND)
+        def build_response():
+            data = get_or_build_menu_payload('product_filter', params, build_payload)
+            if not data:
+                return Response({'error': 'Không có sản phẩm nào trong danh mục này'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(data, status=status.HTTP_200_OK)
 
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        params = {
+            'category_id': category_id,
+            'fields': request.query_params.get('fields'),
+            'omit': request.query_params.get('omit'),
+        }
+        # ETag theo version menu => không cần query DB khi client đã có dữ liệu mới nhất
+        etag = build_etag(build_menu_cache_key('product_filter', params))
+        return conditional_response(request, etag, build_response)
     
     # (thêm)
     def list(self, request, *args, **kwargs):
+        params = {key: request.query_params.get(key) for key in PRODUCT_LIST_PARAMS}
+        etag = build_etag(build_menu_cache_key('product_list', params))
+        return conditional_response(request, etag, lambda: Response(
+            get_or_build_menu_payload('product_list', params, lambda: self._build_list_payload(request))
+        ))
+
+    def _build_list_payload(self, request):
         queryset = self.get_queryset()
         
         #search
         search = request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
+            # tìm không dấu trên search_text, sắp xếp theo độ liên quan
+            queryset = search_products(queryset, search)
             
         # filter category
         category_id = request.query_params.get('category')
@@ -66,18 +103,21 @@ class ProductViewSet(viewsets.ModelViewSet):
             pass  # bỏ qua nếu giá không hợp lệ
             
         # sort
-        sort = request.query_params.get('sort')
-        if sort == 'newest':
-            queryset = queryset.order_by('-created_at')
-            
-        elif sort == 'price_asc':
-            queryset = queryset.order_by('price')
+        ordering = PRODUCT_SORT_ORDERING.get(request.query_params.get('sort'))
+        if ordering:
+            queryset = queryset.order_by(ordering)
 
-        elif sort == 'price_desc':
-            queryset = queryset.order_by('-price')
+        # phân trang keyset (chỉ khi client gửi cursor/page_size)
+        # đang tìm kiếm mà không chọn sort => giữ thứ tự theo độ liên quan
+        if not ordering:
+            ordering = '-search_rank' if 'search_rank' in queryset.query.annotations else '-created_at'
+        paginator = KeysetPagination(ordering=ordering)
+        page = paginator.paginate_queryset(queryset, request)
+        if page is not None:
+            return paginator.get_paginated_payload(list(self.get_serializer(page, many=True).data))
             
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return list(serializer.data)
     
     # --- Custom Action ---
     @action(detail=True, methods=['put'], url_path='status')
@@ -114,7 +154,7 @@ class ImageViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
     def list(self, request, product_pk=None):
-        images = Image.objects.filter(product_id=product_pk)
+        images = Image.objects.filter(product_id=product_pk).order_by('position', 'id')
         serializer = ImageSerializer(images, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     def retrieve(self, request, pk=None, product_pk=None):
@@ -129,8 +169,25 @@ class ImageViewSet(viewsets.ViewSet):
         serializer = ImageSerializer(data=request.data, context={'product': product})
         if serializer.is_valid():
             image = serializer.save()
-            return Response(ImageSerializer(image).data, status=status.HTTP_201_CREATED)
+            data = ImageSerializer(image).data
+            if serializer.near_duplicates:
+                data['near_duplicates'] = serializer.near_duplicates
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def bulk_create(self, request, product_pk=None):
+        product = get_object_or_404(Product, pk=product_pk)
+        serializer = BulkImageUploadSerializer(
+            data={'images': request.FILES.getlist('images')}, context={'product': product}
+        )
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+    def reorder(self, request, product_pk=None):
+        product = get_object_or_404(Product, pk=product_pk)
+        serializer = ImageReorderSerializer(data=request.data, context={'product': product})
+        serializer.is_valid(raise_exception=True)
+        images = serializer.save()
+        return Response(ImageSerializer(images, many=True).data, status=status.HTTP_200_OK)
     def update(self, request, pk=None, product_pk=None):
         try:
             image = Image.objects.get(pk=pk, product=product_pk)
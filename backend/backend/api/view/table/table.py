@@ -1,22 +1,52 @@
 from api.serializers import TableSerializer
 from rest_framework import viewsets
 from api.permission import IsAdminOrReadOnly
-from api.models import Table
+from api.models import Order, Table
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import action
+from core.utils.http_cache import build_etag, queryset_etag, conditional_response
+from core.utils.table_status import floor_summary
+from rest_framework.permissions import SAFE_METHODS
+from api.serializers.mixins import parse_projection
 class TableViewSet(viewsets.ModelViewSet):
     queryset = Table.objects.all()
     serializer_class = TableSerializer
     permission_classes = [IsAdminOrReadOnly]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?fields / ?omit => chỉ SELECT các cột cần thiết
+        if self.request.method in SAFE_METHODS:
+            field_names = TableSerializer.select_field_names(*parse_projection(self.request))
+            if field_names is not None:
+                queryset = queryset.only(*TableSerializer.projected_columns(field_names))
+        return queryset
     
     @action(detail=False, methods=['get'], url_path='available')
     def available_tables(self, request):
-        available_tables = Table.objects.filter(status='available')
-        serializer = TableSerializer(available_tables, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        available_tables = self.get_queryset().filter(status='available')
+        # đổi trạng thái dùng save(update_fields=['status']) nên updated_at không đổi
+        # => thêm danh sách id vào ETag để bắt được bàn vào/ra khỏi danh sách
+        table_ids = list(available_tables.order_by('id').values_list('id', flat=True))
+        return conditional_response(
+            request,
+            # mỗi cách chọn field là 1 representation khác => ETag khác
+            queryset_etag(available_tables, table_ids, parse_projection(request)),
+            lambda: Response(TableSerializer(available_tables, many=True, context={'request': request}).data, status=status.HTTP_200_OK),
+        )
     
+    @action(detail=False, methods=['get'], url_path='summary')
+    def summary(self, request):
+        # màn hình đón khách: số bàn theo trạng thái / sức chứa, đọc từ cache, không query bảng Table
+        data = floor_summary()
+        return conditional_response(
+            request,
+            build_etag('floor', data['version'], data['counts'], data['by_capacity']),
+            lambda: Response(data, status=status.HTTP_200_OK),
+        )
+
     @action(detail=True, methods=['patch'], url_path='disable')
     def disable_table(self, request, pk=None):
         table = self.get_object()
@@ -25,7 +55,7 @@ class TableViewSet(viewsets.ModelViewSet):
                 {"detail": "Bàn đã bị tắt trước đó."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if table.orders.filter(status__in=['pending', 'preparing']).exists():
+        if table.orders.filter(status__in=Order.OPEN_STATUSES).exists():
             return Response(
                 {"detail": "Không thể tắt bàn đang có order"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -8,12 +8,21 @@ from api.models import User
 from api.serializers import UserSerializer
 from api.serializers import StaffUpdateSerializer
 from api.permission import IsAdminUser
+from api.pagination import KeysetPagination
 
 from django.db.models import Q
 
 # phục vụ cho việc tạo mật khẩu tạm thời
 from django.utils.crypto import get_random_string
 
+# sort => field dùng cho keyset pagination
+USER_SORT_ORDERING = {
+    'newest': '-date_joined',
+    'oldest': 'date_joined',
+    'name_asc': 'first_name',
+    'name_desc': '-first_name',
+}
+
 class UserViewSet(ReadOnlyModelViewSet):
     """
     Admin: xem list & detail user
@@ -151,6 +160,12 @@ class UserViewSet(ReadOnlyModelViewSet):
             queryset = queryset.order_by('first_name', 'last_name')
         elif sort == 'name_desc':
             queryset = queryset.order_by('-first_name', '-last_name')
+
+        # phân trang keyset (chỉ khi client gửi cursor/page_size)
+        paginator = KeysetPagination(ordering=USER_SORT_ORDERING.get(sort, '-date_joined'))
+        page = paginator.paginate_queryset(queryset, request)
+        if page is not None:
+            return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
             
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -9,22 +9,25 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
-from core import routing
 
 os.environ.setdefault(
     "DJANGO_SETTINGS_MODULE",
     "backend.settings"
 )
 
+# khởi tạo Django trước khi import consumer / middleware (dùng model, simplejwt)
+django_asgi_app = get_asgi_application()
+
+from core import routing  # noqa: E402
+from core.middleware import JWTAuthMiddlewareStack  # noqa: E402
+
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             routing.websocket_urlpatterns
         )
     ),
 })
-
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -58,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RealtimeBroadcastMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -93,6 +95,47 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (menu, throttle...)
+# Có REDIS_CACHE_URL => dùng chung Redis với channels, không có => local-memory (dev/test)
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default=None)
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# thời gian sống (giây) của payload menu đã serialize, version bị bump thì bỏ qua ngay
+MENU_CACHE_TIMEOUT = config('MENU_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# thời gian (giây) lưu response của Idempotency-Key để replay khi client retry
+IDEMPOTENCY_KEY_TIMEOUT = config('IDEMPOTENCY_KEY_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Realtime: event gửi sau commit qua thread nền, hàng đợi tối đa REALTIME_QUEUE_SIZE batch
+REALTIME_BACKGROUND_SENDER = config('REALTIME_BACKGROUND_SENDER', default=True, cast=bool)
+REALTIME_QUEUE_SIZE = config('REALTIME_QUEUE_SIZE', default=1000, cast=int)
+# event trong cùng cửa sổ (giây) được gộp thành 1 envelope BATCH, tối đa REALTIME_BATCH_MAX_SIZE event
+REALTIME_BATCH_INTERVAL = config('REALTIME_BATCH_INTERVAL', default=0.05, cast=float)
+REALTIME_BATCH_MAX_SIZE = config('REALTIME_BATCH_MAX_SIZE', default=50, cast=int)
+# replay log: client kết nối lại với ?since=<seq> nhận lại tối đa REALTIME_REPLAY_SIZE event
+# còn trong REALTIME_REPLAY_TTL giây, quá thì nhận RESYNC_REQUIRED
+REALTIME_REPLAY_SIZE = config('REALTIME_REPLAY_SIZE', default=500, cast=int)
+REALTIME_REPLAY_TTL = config('REALTIME_REPLAY_TTL', default=600, cast=int)
+# mỗi kết nối WebSocket giữ tối đa REALTIME_SEND_QUEUE_SIZE message chờ gửi
+# (event *_UPDATED cùng entity được gộp, đầy thì bỏ message cũ nhất + RESYNC_REQUIRED);
+# hàng đợi >= REALTIME_SLOW_CONSUMER_DEPTH liên tục REALTIME_SLOW_CONSUMER_TIMEOUT giây => ngắt kết nối
+REALTIME_SEND_QUEUE_SIZE = config('REALTIME_SEND_QUEUE_SIZE', default=100, cast=int)
+REALTIME_SLOW_CONSUMER_DEPTH = config('REALTIME_SLOW_CONSUMER_DEPTH', default=50, cast=int)
+REALTIME_SLOW_CONSUMER_TIMEOUT = config('REALTIME_SLOW_CONSUMER_TIMEOUT', default=10, cast=float)
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -160,6 +203,27 @@ cloudinary.config(
 )
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+
+# upload ảnh lên Cloudinary ở worker nền (thread pool), request chỉ ghi file tạm
+IMAGE_UPLOAD_BACKGROUND = config('IMAGE_UPLOAD_BACKGROUND', default=True, cast=bool)
+IMAGE_UPLOAD_WORKERS = config('IMAGE_UPLOAD_WORKERS', default=2, cast=int)
+IMAGE_UPLOAD_MAX_RETRIES = config('IMAGE_UPLOAD_MAX_RETRIES', default=3, cast=int)
+IMAGE_UPLOAD_RETRY_BACKOFF = config('IMAGE_UPLOAD_RETRY_BACKOFF', default=1.0, cast=float)
+IMAGE_UPLOAD_TMP_DIR = config('IMAGE_UPLOAD_TMP_DIR', default=None)
+# kiểm tra ảnh khi đọc stream (khớp client_max_body_size 20M của nginx)
+IMAGE_UPLOAD_MAX_BYTES = config('IMAGE_UPLOAD_MAX_BYTES', default=20 * 1024 * 1024, cast=int)
+IMAGE_UPLOAD_MAX_DIMENSION = config('IMAGE_UPLOAD_MAX_DIMENSION', default=8000, cast=int)
+# ảnh gần giống (perceptual hash): reject = trả 400, warn = vẫn tạo + trả near_duplicates, off = tắt
+IMAGE_NEAR_DUPLICATE_MODE = config('IMAGE_NEAR_DUPLICATE_MODE', default='warn')
+IMAGE_NEAR_DUPLICATE_DISTANCE = config('IMAGE_NEAR_DUPLICATE_DISTANCE', default=5, cast=int)
+# upload nhiều ảnh 1 request (POST products/<id>/images/bulk)
+IMAGE_BULK_MAX_FILES = config('IMAGE_BULK_MAX_FILES', default=200, cast=int)
+DATA_UPLOAD_MAX_NUMBER_FILES = IMAGE_BULK_MAX_FILES
+# nơi lưu ảnh mới: cloudinary | local (MEDIA_ROOT, nginx phục vụ /media/, chạy được khi mất internet)
+IMAGE_STORAGE_BACKEND = config('IMAGE_STORAGE_BACKEND', default='cloudinary')
+# URL gốc client dùng để tải ảnh local, ví dụ http://192.168.1.10 (rỗng => đường dẫn tương đối)
+IMAGE_LOCAL_BASE_URL = config('IMAGE_LOCAL_BASE_URL', default='')
+IMAGE_LOCAL_CACHE_MAX_AGE = config('IMAGE_LOCAL_CACHE_MAX_AGE', default=7 * 24 * 3600, cast=int)
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -177,6 +241,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
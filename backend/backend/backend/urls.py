@@ -14,13 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.urls import include
 from api.view.payment.payment import sepay_webhook
+from core.views import local_image_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('webhook/sepay/', sepay_webhook, name='sepay_webhook'),  
+    # ảnh lưu local (IMAGE_STORAGE_BACKEND=local), nginx chỉ chuyển về đây khi variant chưa có trên đĩa
+    path(f"{settings.MEDIA_URL.lstrip('/')}images/<str:variant>/<str:filename>", local_image_variant, name='local_image_variant'),
 ]
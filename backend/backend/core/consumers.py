@@ -1,41 +1,278 @@
+import asyncio
 import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from core.utils.kitchen import KITCHEN_GROUP, kitchen_snapshot, station_group
+from core.utils.realtime import build_broadcast_message, packed_from_text
+from core.utils.realtime_groups import STAFF_ROLES, TABLES_GROUP, table_group, user_role
+from core.utils.realtime_log import current_sequence, events_since, record_event
+from core.utils.realtime_queue import SendQueue, record_metrics
+from core.utils.table_status import floor_summary
+
+logger = logging.getLogger(__name__)
+
+MSGPACK_SUBPROTOCOL = "msgpack"
+# đóng handshake: chưa đăng nhập / không đủ quyền (client không cần reconnect)
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+# kết nối nhận chậm quá lâu bị ngắt => client kết nối lại với ?since=<seq>
+CLOSE_SLOW_CONSUMER = 4408
 
 class BaseConsumer(AsyncWebsocketConsumer):
     group_name = None
+    # None => ai cũng kết nối được, ngược lại chỉ các role trong danh sách
+    allowed_roles = None
+    # client xin subprotocol "msgpack" => nhận binary frame MessagePack thay vì JSON text
+    use_msgpack = False
+    # message chờ gửi của kết nối này, writer task gửi lần lượt
+    send_queue = None
+    writer = None
+    slow_since = None
+
+    @property
+    def role(self):
+        return user_role(self.scope.get("user"))
+
+    async def reject(self, code):
+        self.group_name = None
+        await self.close(code=code)
 
     async def connect(self):
+        if self.allowed_roles is not None and self.role not in self.allowed_roles:
+            await self.reject(CLOSE_UNAUTHENTICATED if self.role is None else CLOSE_FORBIDDEN)
+            return
         if not self.group_name:
             raise ValueError("group_name phải được set")
+        self.send_queue = SendQueue(getattr(settings, 'REALTIME_SEND_QUEUE_SIZE', 100))
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
-        await self.accept()
+        if MSGPACK_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            self.use_msgpack = True
+            await self.accept(subprotocol=MSGPACK_SUBPROTOCOL)
+        else:
+            await self.accept()
+        self.writer = asyncio.ensure_future(self.write_loop())
+
+        # client kết nối lại: ws/.../?since=<seq> => gửi bù các event bị lỡ
+        since = parse_qs(self.scope.get("query_string", b"").decode()).get("since")
+        if since:
+            await self.replay_since(since[0])
 
     async def disconnect(self, close_code):
+        await self.stop_writer()
+        if not self.group_name:
+            # bị từ chối trước khi join group
+            return
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        # client cũng có thể gửi {"action": "sync", "since": <seq>} sau khi đã kết nối
+        try:
+            if bytes_data is not None:
+                message = msgpack.unpackb(bytes_data, raw=False)
+            else:
+                message = json.loads(text_data or "{}")
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("action") == "sync":
+            await self.replay_since(message.get("since"))
+
+    async def replay_since(self, since):
+        """
+        Gửi lại các event có seq > since (event live có thể đến trùng,
+        client bỏ qua event có seq <= seq đã nhận).
+        Không replay được => gửi RESYNC_REQUIRED để client tải lại qua REST.
+        """
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            return
+        events = await sync_to_async(events_since)(self.group_name, since)
+        if events is None:
+            seq = await sync_to_async(current_sequence)(self.group_name)
+            await self.send_data({"type": "RESYNC_REQUIRED", "seq": seq})
+            return
+        for data in events:
+            await self.send_data(data)
+
+    async def send_data(self, data):
+        await self.enqueue({"data": data})
+
     async def broadcast(self, event):
-        await self.send(text_data=json.dumps(event["data"]))
+        await self.enqueue(event, event.get("coalesce"))
+
+    async def enqueue(self, event, key=None):
+        """
+        Đưa message vào hàng đợi gửi thay vì await send trực tiếp: socket chậm không chặn
+        việc đọc channel layer (buffer của channels-redis không bị đầy).
+        Hàng đợi vượt REALTIME_SLOW_CONSUMER_DEPTH liên tục quá REALTIME_SLOW_CONSUMER_TIMEOUT giây => ngắt.
+        """
+        if self.send_queue is None:
+            # đã đóng / đã bị ngắt
+            return
+        self.send_queue.put(event, key)
+        if self.update_pressure():
+            await self.evict()
+
+    def update_pressure(self):
+        if len(self.send_queue) < getattr(settings, 'REALTIME_SLOW_CONSUMER_DEPTH', 50):
+            self.slow_since = None
+            return False
+        now = time.monotonic()
+        if self.slow_since is None:
+            self.slow_since = now
+        return now - self.slow_since >= getattr(settings, 'REALTIME_SLOW_CONSUMER_TIMEOUT', 10)
+
+    async def write_loop(self):
+        queue = self.send_queue
+        try:
+            while True:
+                await self.deliver(await queue.get())
+                if not queue:
+                    self.update_pressure()
+                    if queue.stats:
+                        # hết dồn ứ => ghi metrics 1 lần
+                        await sync_to_async(record_metrics)(queue.pop_stats())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Gửi WebSocket thất bại (%s)", self.group_name)
+
+    async def deliver(self, event):
+        # payload đã encode sẵn lúc group_send => không json.dumps lại cho từng socket
+        if "text" in event:
+            if self.use_msgpack:
+                await self.send(bytes_data=packed_from_text(event["text"]))
+            else:
+                await self.send(text_data=event["text"])
+        elif self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb(event["data"], use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(event["data"]))
+
+    async def stop_writer(self):
+        queue, self.send_queue = self.send_queue, None
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+        if queue is not None and queue.stats:
+            await sync_to_async(record_metrics)(queue.pop_stats())
+
+    async def evict(self):
+        queue = self.send_queue
+        logger.warning(
+            "Ngắt kết nối chậm %s (group %s, %s message đang chờ)",
+            self.channel_name, self.group_name, len(queue),
+        )
+        queue.clear()
+        queue.stats["evicted"] += 1
+        await self.stop_writer()
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        self.group_name = None
+        await self.close(code=CLOSE_SLOW_CONSUMER)
 
     async def send_update(self, data):
+        data = await sync_to_async(record_event)(self.group_name, data)
         await self.channel_layer.group_send(
             self.group_name,
-            {
-                "type": "broadcast",
-                "data": data,
-            }
+            build_broadcast_message(data)
         )
 
 class ProductConsumer(BaseConsumer):
     group_name = "products"
-    
+
 class ImageConsumer(BaseConsumer):
+    # trạng thái upload / xử lý ảnh chỉ màn hình quản trị cần
     group_name = "images"
-    
+    allowed_roles = ('admin',)
+
 class TableConsumer(BaseConsumer):
-    group_name = "tables"
\ No newline at end of file
+    """
+    ws/tables/?table=<id>: tablet tại bàn (không cần đăng nhập), chỉ nhận event của bàn đó.
+    ws/tables/: nhân viên (cần token), nhận event của mọi bàn; kết nối mới nhận
+    FLOOR_SNAPSHOT (số bàn theo trạng thái / sức chứa, đọc từ cache) rồi FLOOR_UPDATED.
+    """
+
+    async def connect(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        table = query.get("table", [""])[0]
+        if table.isdigit():
+            self.group_name = table_group(int(table))
+        elif self.role in STAFF_ROLES:
+            self.group_name = TABLES_GROUP
+        else:
+            await self.reject(CLOSE_UNAUTHENTICATED if self.role is None else CLOSE_FORBIDDEN)
+            return
+        await super().connect()
+        if self.group_name == TABLES_GROUP and not query.get("since"):
+            seq = await sync_to_async(current_sequence)(self.group_name)
+            summary = await sync_to_async(floor_summary)()
+            await self.send_data({"type": "FLOOR_SNAPSHOT", "seq": seq, "summary": summary})
+
+class KitchenConsumer(BaseConsumer):
+    """
+    Màn hình bếp: ws/kitchen/?station=<category_id> chỉ nhận ticket của trạm đó,
+    không có station => nhận tất cả (màn hình tổng).
+    Kết nối mới nhận KITCHEN_SNAPSHOT (hàng đợi ticket đang mở, đọc từ cache),
+    sau đó các event TICKET_* đúng thứ tự seq.
+    """
+    allowed_roles = ('chef', 'waiter', 'admin')
+    last_seq = None
+
+    async def connect(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        station = query.get("station", [""])[0]
+        self.station_id = int(station) if station.isdigit() else None
+        self.group_name = station_group(self.station_id) if self.station_id is not None else KITCHEN_GROUP
+        await super().connect()
+        if self.group_name is None:
+            return
+        if not query.get("since"):
+            # đọc seq trước board: event đến sau snapshot có thể trùng nhưng không bị thiếu
+            seq = await sync_to_async(current_sequence)(self.group_name)
+            tickets = await sync_to_async(kitchen_snapshot)(self.station_id)
+            await self.send_data({"type": "KITCHEN_SNAPSHOT", "seq": seq, "tickets": tickets})
+
+    async def send_data(self, data):
+        await super().send_data(data)
+        if isinstance(data.get("seq"), int):
+            self.last_seq = max(self.last_seq or 0, data["seq"])
+
+    async def broadcast(self, event):
+        if self.send_queue is None:
+            return
+        seq = event.get("seq")
+        if seq is None or self.last_seq is None:
+            await super().broadcast(event)
+            if isinstance(seq, int):
+                self.last_seq = seq
+            return
+        if seq <= self.last_seq:
+            # đã gửi (qua snapshot / replay / lấp chỗ trống)
+            return
+        filled = True
+        if seq > self.last_seq + 1:
+            # worker khác lấy seq trước nhưng gửi sau => lấy event còn thiếu từ replay log
+            missing = await sync_to_async(events_since)(self.group_name, self.last_seq)
+            if missing is None:
+                # event thiếu chưa kịp ghi log => giữ last_seq để event đó vẫn được nhận khi tới
+                filled = False
+            else:
+                for data in missing:
+                    if data["seq"] < seq:
+                        await self.send_data(data)
+        await super().broadcast(event)
+        if filled:
+            self.last_seq = seq
@@ -0,0 +1,65 @@
+import os
+import resource
+import struct
+import time
+import tracemalloc
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+
+from core.utils.image_hash import hash_image
+from core.utils.image_ingest import stage_upload
+
+
+class Command(BaseCommand):
+    help = "Đo bộ nhớ đỉnh khi ingest ảnh: cách cũ (đọc nhiều lần, buffer cả file) và stage_upload (1 lượt)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=20)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def _make_upload(self, size):
+        upload = TemporaryUploadedFile('bench.png', 'image/png', size, None)
+        upload.write(b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 4000, 3000) + b'\x08\x02\x00\x00\x00')
+        remaining = size - upload.tell()
+        while remaining > 0:
+            block = os.urandom(min(remaining, 1024 * 1024))
+            upload.write(block)
+            remaining -= len(block)
+        upload.seek(0)
+        return upload
+
+    def _legacy(self, upload):
+        # hash_image + seek lại + đọc toàn bộ file để gửi đi (như cloudinary.uploader.upload(file))
+        hash_image(upload)
+        upload.seek(0)
+        return len(upload.read())
+
+    def _streaming(self, upload):
+        staged = stage_upload(upload)
+        staged.discard()
+        return staged.size
+
+    def _measure(self, name, func, size, runs):
+        peaks, durations = [], []
+        for _ in range(runs):
+            upload = self._make_upload(size)
+            tracemalloc.start()
+            started = time.perf_counter()
+            func(upload)
+            durations.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            upload.close()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f"{name:<10} python peak={max(peaks) / 1024 / 1024:7.2f} MB  "
+            f"time={min(durations) * 1000:7.1f} ms  process max RSS={rss:7.1f} MB"
+        )
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        runs = options['runs']
+        # chạy streaming trước: max RSS của process chỉ tăng, không giảm
+        self._measure('streaming', self._streaming, size, runs)
+        self._measure('legacy', self._legacy, size, runs)
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.utils.image_ingest import failed_upload_path, process_image_upload
+
+
+class Command(BaseCommand):
+    help = (
+        "Upload lại các ảnh ở trạng thái failed từ file tạm được giữ lại. "
+        "Ảnh không còn file tạm (thư mục tạm bị dọn) cần upload lại qua API sửa ảnh."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Chỉ retry các Image id này")
+
+    def handle(self, *args, **options):
+        from api.models import Image
+
+        images = Image.objects.filter(status='failed').order_by('id')
+        if options['ids']:
+            images = images.filter(id__in=options['ids'])
+
+        retried = missing = 0
+        for image in images:
+            path = failed_upload_path(image.id)
+            if not os.path.exists(path):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"Ảnh {image.id}: không còn file tạm, cần upload lại"))
+                continue
+            Image.objects.filter(pk=image.id, status='failed').update(status='pending')
+            process_image_upload(image.id, path, image.image_hash)
+            image.refresh_from_db(fields=['status'])
+            retried += image.status == 'ready'
+            self.stdout.write(f"Ảnh {image.id}: {image.status}")
+
+        self.stdout.write(self.style.SUCCESS(f"Đã upload lại {retried} ảnh, {missing} ảnh cần upload lại"))
@@ -0,0 +1,67 @@
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from core.utils.realtime import open_request_buffer, flush_request_buffer
+
+
+class RealtimeBroadcastMiddleware:
+    """
+    Gom các event realtime phát sinh trong 1 request (đã commit) và gửi 1 lần
+    cho thread nền sau khi view xử lý xong.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = open_request_buffer()
+        try:
+            return self.get_response(request)
+        finally:
+            flush_request_buffer(token)
+
+
+def _get_raw_token(scope):
+    # trình duyệt không gửi được header khi mở WebSocket => nhận cả ?token=<access>
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+    if token:
+        return token[0].encode()
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.split()
+            if len(parts) == 2 and parts[0].lower() == b"bearer":
+                return parts[1]
+    return None
+
+
+@database_sync_to_async
+def _get_jwt_user(raw_token):
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Xác thực WebSocket bằng access token simplejwt (giống OptionalJWTAuthentication):
+    không có token / token sai => AnonymousUser, consumer tự quyết định có nhận kết nối không.
+    """
+
+    async def __call__(self, scope, receive, send):
+        raw_token = _get_raw_token(scope)
+        if raw_token is not None:
+            scope = dict(scope, user=await _get_jwt_user(raw_token))
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    # session auth trước, token (nếu có) ghi đè scope["user"]
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
@@ -5,4 +5,5 @@ websocket_urlpatterns = [
     path('ws/products/', consumers.ProductConsumer.as_asgi()),
     path('ws/images/', consumers.ImageConsumer.as_asgi()),
     path('ws/tables/', consumers.TableConsumer.as_asgi()),
+    path('ws/kitchen/', consumers.KitchenConsumer.as_asgi()),
 ]
\ No newline at end of file
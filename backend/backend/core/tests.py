@@ -1,3 +1,521 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from core.consumers import CLOSE_FORBIDDEN, CLOSE_SLOW_CONSUMER, CLOSE_UNAUTHENTICATED, KitchenConsumer, ProductConsumer, TableConsumer
+from core.middleware import JWTAuthMiddlewareStack
+from core.utils.cache_lock import LockTimeout, cache_lock
+from core.utils.kitchen import BOARD_KEY, station_group
+from core.utils.image_ingest import InvalidImageError, read_image_size, stage_upload
+from core.utils.cloudinary_image_utils import build_cloudinary_url, build_image_variants
+from core.utils.image_storage import LocalImageStorage, get_image_storage
+from core.utils.menu_cache import CATALOG_VERSION_KEY, bump_catalog_version, get_catalog_version
+from core.utils.perceptual_hash import BKTree, dhash, hamming_distance
+from core.utils.realtime import RealtimeSender, _send_messages, broadcast_utils, build_broadcast_message, build_envelopes, open_request_buffer, flush_request_buffer, packed_from_text
+from core.utils.realtime_groups import TABLES_GROUP, table_group
+from core.utils.realtime_log import events_since, record_event
+from core.utils.realtime_queue import SendQueue, realtime_metrics
+from core.utils.table_status import FLOOR_STATE_KEY, FLOOR_SUMMARY_KEY
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class StaffUser:
+    is_authenticated = True
+
+    def __init__(self, role):
+        self.role = role
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, REALTIME_BACKGROUND_SENDER=False)
+class BroadcastUtilsTest(TestCase):
+    def setUp(self):
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)("products", self.channel)
+
+    def _drain(self):
+        messages = []
+        queue = self.layer.channels.get(self.channel)
+        while queue is not None and queue.qsize():
+            messages.append(async_to_sync(self.layer.receive)(self.channel))
+        return messages
+
+    def test_sent_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast_utils("products", {"type": "PRODUCT_UPDATED", "id": 1})
+            self.assertEqual(self._drain(), [])
+        self.assertEqual(len(self._drain()), 1)
+
+    def test_rolled_back_event_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    broadcast_utils("products", {"type": "PRODUCT_UPDATED", "id": 1})
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self._drain(), [])
+
+    def test_request_buffer_coalesces_same_entity(self):
+        token = open_request_buffer()
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast_utils("products", {"type": "PRODUCT_UPDATED", "product": {"id": 1, "name": "a"}})
+            broadcast_utils("products", {"type": "PRODUCT_UPDATED", "product": {"id": 2, "name": "b"}})
+            broadcast_utils("products", {"type": "PRODUCT_UPDATED", "product": {"id": 1, "name": "c"}})
+        self.assertEqual(self._drain(), [])
+        flush_request_buffer(token)
+        messages = self._drain()
+        self.assertEqual(len(messages), 1)
+        data = json.loads(messages[0]["text"])
+        self.assertEqual(data["type"], "BATCH")
+        self.assertIn("seq", data)
+        self.assertEqual(msgpack.unpackb(packed_from_text(messages[0]["text"])), data)
+        names = [event["product"]["name"] for event in data["events"]]
+        self.assertEqual(names, ["b", "c"])
+
+
+class RealtimeSenderTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_dropped_batch_triggers_resync_for_its_groups(self):
+        sender = RealtimeSender(1)
+        # không chạy thread nền => tự lấy batch ra như worker
+        sender._ensure_started = lambda: None
+        sender.submit([("tables", {"type": "TABLE_DELETED", "id": 1})])
+        sender.submit([("products", {"type": "PRODUCT_UPDATED", "id": 2})])
+        self.assertEqual(sender.dropped, 1)
+
+        envelopes = sender.build_batch(sender._queue.get_nowait())
+        self.assertEqual([(group, data["type"]) for group, data in envelopes], [("tables", "RESYNC_REQUIRED"), ("products", "PRODUCT_UPDATED")])
+        # marker có seq + nằm trong replay log => client kết nối lại cũng nhận được
+        self.assertEqual(events_since("tables", envelopes[0][1]["seq"] - 1), [envelopes[0][1]])
+        self.assertEqual(sender.build_batch([]), [])
+
+    @override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+    async def test_resync_marker_reaches_client_as_its_own_frame(self):
+        communicator = WebsocketCommunicator(ProductConsumer.as_asgi(), "/ws/products/")
+        self.assertTrue((await communicator.connect())[0])
+        sender = RealtimeSender(1)
+        sender._ensure_started = lambda: None
+        sender.submit([("products", {"type": "PRODUCT_UPDATED", "id": 1})])
+        sender.submit([("products", {"type": "PRODUCT_UPDATED", "id": 2})])
+        envelopes = await sync_to_async(sender.build_batch)(sender._queue.get_nowait())
+        await _send_messages(get_channel_layer(), envelopes)
+
+        # useWebsocket.ts gọi onResync của screen với frame này: không nằm trong BATCH, có seq để kết nối lại
+        marker = await communicator.receive_json_from()
+        self.assertEqual(marker["type"], "RESYNC_REQUIRED")
+        self.assertIsInstance(marker["seq"], int)
+        self.assertEqual((await communicator.receive_json_from())["id"], 2)
+        await communicator.disconnect()
+
+
+class CacheLockTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_timeout_raises_without_running_or_releasing(self):
+        cache.set("lock:test", "other", timeout=None)
+        ran = False
+        with self.assertLogs('core.utils.cache_lock', level='WARNING'), self.assertRaises(LockTimeout):
+            with cache_lock("lock:test", timeout=0.01):
+                ran = True
+        self.assertFalse(ran)
+        self.assertEqual(cache.get("lock:test"), "other")
+        cache.delete("lock:test")
+        with cache_lock("lock:test", timeout=0.01):
+            self.assertIsNotNone(cache.get("lock:test"))
+        self.assertIsNone(cache.get("lock:test"))
+
+class BuildEnvelopesTest(SimpleTestCase):
+    def test_single_event_is_sent_unwrapped(self):
+        event = {"type": "TABLE_UPDATED", "table": {"id": 1}}
+        self.assertEqual(build_envelopes([("tables", event)]), [("tables", event)])
+
+    def test_batches_per_group_with_max_size(self):
+        messages = [("products", {"type": "PRODUCT_UPDATED", "id": i}) for i in range(5)]
+        messages.append(("tables", {"type": "TABLE_UPDATED", "id": 1}))
+        messages.append(("products", {"type": "PRODUCT_UPDATED", "id": 0, "name": "last"}))
+        envelopes = build_envelopes(messages, max_size=3)
+        self.assertEqual([group for group, _ in envelopes], ["products", "products", "tables"])
+        first, second = envelopes[0][1], envelopes[1][1]
+        self.assertEqual([event["id"] for event in first["events"]], [1, 2, 3])
+        self.assertEqual([event["id"] for event in second["events"]], [4, 0])
+        self.assertEqual(second["events"][1]["name"], "last")
+
+
+class CatalogVersionTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_evicted_version_never_repeats(self):
+        bump_catalog_version()
+        seen = get_catalog_version()
+        # key version bị cull => không quay về version cũ (payload / ETag cũ bị coi là hiện tại)
+        cache.delete(CATALOG_VERSION_KEY)
+        self.assertGreater(get_catalog_version(), seen)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, REALTIME_REPLAY_SIZE=3)
+class ReplayLogTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_events_since(self):
+        seqs = [record_event("products", {"type": "PRODUCT_UPDATED", "id": i})["seq"] for i in range(4)]
+        self.assertEqual(seqs, list(range(seqs[0], seqs[0] + 4)))
+        self.assertEqual([event["seq"] for event in events_since("products", seqs[1])], seqs[2:])
+        self.assertEqual(events_since("products", seqs[3]), [])
+        # khoảng trống quá REALTIME_REPLAY_SIZE hoặc seq lạ => phải resync
+        self.assertIsNone(events_since("products", seqs[0] - 1))
+        self.assertIsNone(events_since("products", seqs[3] + 10))
+
+    def test_evicted_counter_never_goes_backwards(self):
+        last = record_event("products", {"type": "PRODUCT_UPDATED", "id": 1})["seq"]
+        cache.delete("realtime:seq:products")
+        self.assertGreater(record_event("products", {"type": "PRODUCT_UPDATED", "id": 1})["seq"], last)
+        # client giữ seq cũ => khoảng trống quá lớn => resync
+        self.assertIsNone(events_since("products", last))
+
+    async def test_consumer_replays_missed_events(self):
+        seqs = [
+            (await sync_to_async(record_event)("products", {"type": "PRODUCT_UPDATED", "id": i}))["seq"]
+            for i in range(3)
+        ]
+        communicator = WebsocketCommunicator(ProductConsumer.as_asgi(), f"/ws/products/?since={seqs[0]}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())["seq"], seqs[1])
+        self.assertEqual((await communicator.receive_json_from())["seq"], seqs[2])
+
+        await communicator.send_json_to({"action": "sync", "since": -5})
+        self.assertEqual((await communicator.receive_json_from())["type"], "RESYNC_REQUIRED")
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ConsumerEncodingTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_json_and_msgpack_clients_receive_pre_encoded_payload(self):
+        json_client = WebsocketCommunicator(ProductConsumer.as_asgi(), "/ws/products/")
+        packed_client = WebsocketCommunicator(ProductConsumer.as_asgi(), "/ws/products/", subprotocols=["msgpack"])
+        self.assertTrue((await json_client.connect())[0])
+        connected, subprotocol = await packed_client.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, "msgpack")
+
+        second_packed = WebsocketCommunicator(ProductConsumer.as_asgi(), "/ws/products/", subprotocols=["msgpack"])
+        self.assertTrue((await second_packed.connect())[0])
+
+        data = {"type": "PRODUCT_UPDATED", "id": 1, "seq": 1}
+        message = build_broadcast_message(data)
+        # chỉ 1 bản encode đi qua channel layer
+        self.assertNotIn("packed", message)
+        packed_from_text.cache_clear()
+        await get_channel_layer().group_send("products", message)
+
+        self.assertEqual(await json_client.receive_json_from(), data)
+        self.assertEqual(msgpack.unpackb(await packed_client.receive_from()), data)
+        self.assertEqual(msgpack.unpackb(await second_packed.receive_from()), data)
+        # 2 socket MessagePack, convert 1 lần
+        self.assertEqual(packed_from_text.cache_info().misses, 1)
+        for client in (json_client, packed_client, second_packed):
+            await client.disconnect()
+
+
+def png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', width, height) + b'\x08\x02\x00\x00\x00'
+
+
+class StageUploadTest(SimpleTestCase):
+    def test_read_image_size_formats(self):
+        jpeg = b'\xff\xd8\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + b'\x00' * 9 + b'\xff\xc0' + struct.pack('>HBHH', 17, 8, 480, 640)
+        gif = b'GIF89a' + struct.pack('<HH', 320, 200)
+        webp = b'RIFF' + b'\x00' * 4 + b'WEBPVP8X' + b'\x00' * 8 + (99).to_bytes(3, 'little') + (49).to_bytes(3, 'little')
+        self.assertEqual(read_image_size(png_header(800, 600)), ('png', 800, 600))
+        self.assertEqual(read_image_size(jpeg), ('jpeg', 640, 480))
+        self.assertEqual(read_image_size(gif), ('gif', 320, 200))
+        self.assertEqual(read_image_size(webp), ('webp', 100, 50))
+        self.assertIsNone(read_image_size(b'not an image'))
+
+    def test_stage_hashes_and_writes_in_one_pass(self):
+        content = png_header(800, 600) + os.urandom(300 * 1024)
+        staged = stage_upload(SimpleUploadedFile('a.png', content))
+        try:
+            self.assertEqual(staged.sha256, hashlib.sha256(content).hexdigest())
+            self.assertEqual((staged.format, staged.width, staged.height, staged.size), ('png', 800, 600, len(content)))
+            with open(staged.path, 'rb') as f:
+                self.assertEqual(f.read(), content)
+        finally:
+            staged.discard()
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024, IMAGE_UPLOAD_MAX_DIMENSION=1000)
+    def test_rejects_invalid_uploads_without_leaving_temp_files(self):
+        cases = [
+            png_header(10, 10) + b'\x00' * 2048,
+            png_header(4000, 10),
+            b'plain text',
+        ]
+        for content in cases:
+            with mock.patch('core.utils.image_ingest.os.remove', wraps=os.remove) as remove:
+                with self.assertRaises(InvalidImageError):
+                    stage_upload(SimpleUploadedFile('x.png', content))
+            remove.assert_called_once()
+            self.assertFalse(os.path.exists(remove.call_args[0][0]))
+
+
+def save_sample_photo(path, size, image_format):
+    from PIL import Image as PILImage, ImageDraw
+
+    img = PILImage.new('RGB', (256, 256), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 256, 32):
+        draw.rectangle((i, i // 2, i + 24, 255 - i // 3), fill=(i, 255 - i, (i * 3) % 255))
+    draw.ellipse((60, 40, 200, 180), fill=(20, 40, 200))
+    img.resize(size).save(path, image_format)
+
+
+class PerceptualHashTest(SimpleTestCase):
+    def test_resized_recompressed_copy_is_close(self):
+        directory = tempfile.mkdtemp()
+        original = os.path.join(directory, 'a.png')
+        copy = os.path.join(directory, 'b.jpg')
+        save_sample_photo(original, (256, 256), 'PNG')
+        save_sample_photo(copy, (120, 120), 'JPEG')
+        other = os.path.join(directory, 'c.png')
+        from PIL import Image as PILImage
+        PILImage.open(original).transpose(PILImage.Transpose.ROTATE_90).save(other)
+
+        a, b, c = (int(dhash(path), 16) for path in (original, copy, other))
+        self.assertLessEqual(hamming_distance(a, b), 5)
+        self.assertGreater(hamming_distance(a, c), 10)
+        self.assertIsNone(dhash(os.path.join(directory, 'missing.png')))
+
+    def test_bk_tree_matches_linear_scan(self):
+        import random
+        rng = random.Random(1)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        query = values[7] ^ 0b1011
+        expected = sorted(
+            (hamming_distance(query, value), i) for i, value in enumerate(values)
+            if hamming_distance(query, value) <= 12
+        )
+        self.assertEqual(sorted(tree.search(query, 12)), expected)
+        self.assertEqual(tree.search(query, 3)[0], (3, 7))
+
+
+class LocalImageStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_STORAGE_BACKEND='local', IMAGE_LOCAL_BASE_URL='http://192.168.1.10'
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        source = os.path.join(self.media_root, 'upload.tmp')
+        save_sample_photo(source, (1000, 800), 'JPEG')
+        self.public_id = get_image_storage().save(source)
+
+    def test_urls_point_to_media(self):
+        stem = self.public_id[len('local/'):-len('.jpg')]
+        self.assertEqual(build_cloudinary_url(self.public_id), f'http://192.168.1.10/media/images/original/{stem}.jpg')
+        variants = build_image_variants(self.public_id)
+        self.assertEqual(variants['thumb'], f'http://192.168.1.10/media/images/thumb/{stem}.webp')
+        self.assertIn(f'/media/images/card/{stem}.avif 480w', variants['srcset']['avif'])
+
+    def test_variant_generated_lazily_and_cached_on_disk(self):
+        stem = self.public_id[len('local/'):-len('.jpg')]
+        cached = os.path.join(self.media_root, 'images', 'card', f'{stem}.webp')
+        self.assertFalse(os.path.exists(cached))
+
+        response = Client().get(f'/media/images/card/{stem}.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        b''.join(response.streaming_content)
+        response.close()
+        from PIL import Image as PILImage
+        with PILImage.open(cached) as img:
+            self.assertEqual(img.size, (480, 384))
+
+        mtime = os.path.getmtime(cached)
+        Client().get(f'/media/images/card/{stem}.webp').close()
+        self.assertEqual(os.path.getmtime(cached), mtime)
+        self.assertEqual(Client().get(f'/media/images/huge/{stem}.webp').status_code, 404)
+        self.assertEqual(Client().get('/media/images/card/..%2Fsecret.webp').status_code, 404)
+
+        LocalImageStorage().delete(self.public_id)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'images', 'card')), [])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'images', 'original')), [])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class KitchenConsumerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        ticket = {"id": "1-3", "order_id": 1, "station_id": 3, "created_at": "2026-01-01T10:00:00", "items": []}
+        cache.set(BOARD_KEY, {3: {"1-3": ticket}, 4: {"1-4": dict(ticket, id="1-4", station_id=4)}}, timeout=None)
+
+    async def test_snapshot_then_events_in_seq_order(self):
+        group = station_group(3)
+        communicator = WebsocketCommunicator(KitchenConsumer.as_asgi(), "/ws/kitchen/?station=3")
+        communicator.scope["user"] = StaffUser("chef")
+        self.assertTrue((await communicator.connect())[0])
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "KITCHEN_SNAPSHOT")
+        self.assertEqual([ticket["id"] for ticket in snapshot["tickets"]], ["1-3"])
+
+        first = record_event(group, {"type": "TICKET_CREATED", "id": "2-3"})
+        second = record_event(group, {"type": "TICKET_UPDATED", "id": "2-3"})
+        # event thứ 2 tới trước event thứ 1 => consumer lấy event 1 từ replay log, event 1 tới sau thì bỏ
+        await get_channel_layer().group_send(group, build_broadcast_message(second))
+        self.assertEqual((await communicator.receive_json_from())["seq"], first["seq"])
+        self.assertEqual((await communicator.receive_json_from())["seq"], second["seq"])
+        await get_channel_layer().group_send(group, build_broadcast_message(first))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ScopedConsumerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.summary = {"version": 1, "total": 2, "counts": {"available": 1, "occupied": 1, "reserved": 0}, "by_capacity": {}}
+        cache.set_many({FLOOR_STATE_KEY: {5: ("available", 4), 6: ("occupied", 4)}, FLOOR_SUMMARY_KEY: self.summary})
+
+    async def _connect(self, consumer, path, user=None):
+        communicator = WebsocketCommunicator(consumer.as_asgi(), path)
+        if user is not None:
+            communicator.scope["user"] = user
+        return communicator, await communicator.connect()
+
+    async def test_table_tablet_only_receives_its_table(self):
+        tablet, (connected, _) = await self._connect(TableConsumer, "/ws/tables/?table=5")
+        self.assertTrue(connected)
+        staff, (connected, _) = await self._connect(TableConsumer, "/ws/tables/", StaffUser("waiter"))
+        self.assertTrue(connected)
+        snapshot = await staff.receive_json_from()
+        self.assertEqual((snapshot["type"], snapshot["summary"]), ("FLOOR_SNAPSHOT", self.summary))
+
+        layer = get_channel_layer()
+        for table_id in (5, 6):
+            data = {"type": "TABLE_UPDATED", "table": {"id": table_id}}
+            await layer.group_send(table_group(table_id), build_broadcast_message(data))
+            await layer.group_send(TABLES_GROUP, build_broadcast_message(data))
+
+        self.assertEqual((await tablet.receive_json_from())["table"]["id"], 5)
+        self.assertTrue(await tablet.receive_nothing())
+        self.assertEqual([(await staff.receive_json_from())["table"]["id"] for _ in range(2)], [5, 6])
+        await tablet.disconnect()
+        await staff.disconnect()
+
+    async def test_role_scoped_consumers_reject_handshake(self):
+        _, (connected, code) = await self._connect(TableConsumer, "/ws/tables/")
+        self.assertEqual((connected, code), (False, CLOSE_UNAUTHENTICATED))
+        _, (connected, code) = await self._connect(KitchenConsumer, "/ws/kitchen/", StaffUser("customer"))
+        self.assertEqual((connected, code), (False, CLOSE_FORBIDDEN))
+        # sản phẩm (menu) vẫn công khai
+        product, (connected, _) = await self._connect(ProductConsumer, "/ws/products/")
+        self.assertTrue(connected)
+        await product.disconnect()
+
+
+class JWTAuthMiddlewareTest(TestCase):
+    async def _scope_user(self, path, headers=None):
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen["user"] = scope["user"]
+            await send({"type": "websocket.close"})
+
+        communicator = WebsocketCommunicator(JWTAuthMiddlewareStack(app), path, headers=headers or [])
+        await communicator.connect()
+        return seen["user"]
+
+    async def test_token_from_query_or_header(self):
+        from django.contrib.auth import get_user_model
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user = await get_user_model().objects.acreate(username="chef", role="chef")
+        token = str(AccessToken.for_user(user))
+
+        self.assertEqual((await self._scope_user(f"/ws/kitchen/?token={token}")).pk, user.pk)
+        header_user = await self._scope_user("/ws/kitchen/", [(b"authorization", f"Bearer {token}".encode())])
+        self.assertEqual(header_user.pk, user.pk)
+        self.assertFalse((await self._scope_user("/ws/kitchen/?token=broken")).is_authenticated)
+
+
+class SendQueueTest(SimpleTestCase):
+    async def _drain(self, queue):
+        items = []
+        while len(queue):
+            items.append(await queue.get())
+        return items
+
+    async def test_coalesce_keeps_latest_at_the_end(self):
+        queue = SendQueue(10)
+        queue.put({"seq": 1}, "TABLE_UPDATED:1")
+        queue.put({"seq": 2})
+        queue.put({"seq": 3}, "TABLE_UPDATED:1")
+        self.assertEqual([item["seq"] for item in await self._drain(queue)], [2, 3])
+        self.assertEqual(queue.stats["coalesced"], 1)
+
+    async def test_drop_oldest_leaves_resync_marker_first(self):
+        queue = SendQueue(3)
+        for seq in range(1, 6):
+            queue.put({"seq": seq})
+        items = await self._drain(queue)
+        self.assertEqual(items[0]["data"], {"type": "RESYNC_REQUIRED", "seq": 3})
+        self.assertEqual([item["seq"] for item in items[1:]], [4, 5])
+        self.assertEqual(queue.stats["dropped"], 3)
+
+
+class StalledConsumer(ProductConsumer):
+    # socket không nhận được gì => writer kẹt ở message đầu tiên
+    async def deliver(self, event):
+        await asyncio.Event().wait()
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_LAYER,
+    REALTIME_SEND_QUEUE_SIZE=5,
+    REALTIME_SLOW_CONSUMER_DEPTH=3,
+    REALTIME_SLOW_CONSUMER_TIMEOUT=0,
+)
+class SlowConsumerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_slow_consumer_is_evicted_and_counted(self):
+        communicator = WebsocketCommunicator(StalledConsumer.as_asgi(), "/ws/products/")
+        self.assertTrue((await communicator.connect())[0])
+        layer = get_channel_layer()
+        for seq in range(1, 6):
+            await layer.group_send("products", build_broadcast_message({"type": "PRODUCT_CREATED", "id": seq, "seq": seq}))
+
+        output = await communicator.receive_output()
+        self.assertEqual(output, {"type": "websocket.close", "code": CLOSE_SLOW_CONSUMER})
+        self.assertNotIn("products", layer.groups)
+        metrics = await sync_to_async(realtime_metrics)()
+        self.assertEqual(metrics["evicted"], 1)
+        # writer giữ 1 message, 3 message còn trong hàng đợi bị bỏ khi ngắt
+        self.assertEqual(metrics["dropped"], 3)
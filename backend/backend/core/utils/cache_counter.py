@@ -0,0 +1,31 @@
+import time
+
+from django.core.cache import cache
+
+
+def counter_seed():
+    """
+    Giá trị khởi tạo khi key đếm chưa có / bị evict: thời gian hiện tại (µs, < 2^53 nên JS đọc đúng).
+    Counter tăng chậm hơn 1 lần/µs => giá trị mới luôn lớn hơn mọi giá trị đã phát,
+    không lặp lại version / seq cũ (payload cache cũ, ETag cũ, seq client đã nhận).
+    """
+    return time.time_ns() // 1000
+
+
+def get_counter(key):
+    value = cache.get(key)
+    if value is None:
+        # add() không ghi đè nếu process khác vừa khởi tạo
+        cache.add(key, counter_seed(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def incr_counter(key):
+    cache.add(key, counter_seed(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # key vừa bị xóa giữa add() và incr()
+        cache.add(key, counter_seed(), timeout=None)
+        return cache.incr(key)
@@ -0,0 +1,35 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(RuntimeError):
+    pass
+
+
+@contextmanager
+def cache_lock(key, timeout=5):
+    """
+    Lock dùng chung giữa các worker: cache.add nguyên tử (Redis SET NX).
+    Quá timeout giây vẫn chưa lấy được => LockTimeout, không chạy đoạn cần khóa
+    (chạy không khóa thì đọc-sửa-ghi chồng nhau, mất cập nhật).
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    acquired = cache.add(key, token, timeout=timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.005)
+        acquired = cache.add(key, token, timeout=timeout)
+    if not acquired:
+        logger.warning("Không lấy được lock %s sau %ss", key, timeout)
+        raise LockTimeout(key)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
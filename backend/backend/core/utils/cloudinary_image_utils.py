@@ -1,5 +1,9 @@
+from functools import lru_cache
+
 from cloudinary.utils import cloudinary_url
 
+from core.utils.image_storage import LOCAL_PREFIX, local_format, local_media_url, resolve_local_image
+
 def _resolve_public_id(value):
     """
     Trả về public_id string từ value.
@@ -19,7 +23,13 @@ def build_cloudinary_url(value, **cloudinary_opts):
     """
     Trả về URL (string) hoặc None. Bọc cloudinary_url an toàn.
     cloudinary_opts sẽ chuyển tới cloudinary.utils.cloudinary_url (transformations...)
+    Ảnh lưu local (IMAGE_STORAGE_BACKEND=local) => URL file gốc dưới MEDIA_URL.
     """
+    local = resolve_local_image(value)
+    if local:
+        stem, extension = local
+        return local_media_url('original', f"{stem}.{extension}")
+
     public_id = _resolve_public_id(value)
     if not public_id:
         return None
@@ -32,4 +42,52 @@ def build_cloudinary_url(value, **cloudinary_opts):
         try:
             return str(public_id)
         except Exception:
-            return None
\ No newline at end of file
+            return None
+
+# Kích thước ảnh theo chỗ hiển thị, Cloudinary resize + đổi định dạng khi phát qua CDN
+IMAGE_VARIANTS = {
+    'thumb': {'width': 160, 'height': 160, 'crop': 'fill', 'gravity': 'auto'},
+    'card': {'width': 480, 'crop': 'limit'},
+    'full': {'width': 1600, 'crop': 'limit'},
+}
+IMAGE_VARIANT_FORMATS = ('avif', 'webp')
+
+
+@lru_cache(maxsize=4096)
+def build_variant_url(public_id, variant, image_format='auto'):
+    """
+    URL của 1 variant (memo theo public_id + variant + format; ảnh đổi => public_id mới).
+    image_format='auto' => f_auto, Cloudinary chọn AVIF/WebP theo client.
+    Ảnh local => URL file variant, tạo lazily lần đầu được request (core.views.local_image_variant).
+    """
+    if public_id.startswith(LOCAL_PREFIX):
+        return local_media_url(variant, f"{public_id[len(LOCAL_PREFIX):]}.{local_format(image_format)}")
+    url, _ = cloudinary_url(
+        public_id,
+        fetch_format=image_format,
+        quality='auto',
+        secure=True,
+        **IMAGE_VARIANTS[variant],
+    )
+    return url
+
+def build_image_variants(value):
+    """
+    {"thumb", "card", "full": URL f_auto, "srcset": {"avif": "... 160w, ...", "webp": ...}}
+    hoặc None nếu chưa có ảnh.
+    """
+    local = resolve_local_image(value)
+    # ảnh local: variant chỉ cần uuid, bỏ đuôi file gốc
+    public_id = LOCAL_PREFIX + local[0] if local else _resolve_public_id(value)
+    if not public_id:
+        return None
+
+    variants = {name: build_variant_url(public_id, name) for name in IMAGE_VARIANTS}
+    variants['srcset'] = {
+        image_format: ", ".join(
+            f"{build_variant_url(public_id, name, image_format)} {options['width']}w"
+            for name, options in IMAGE_VARIANTS.items()
+        )
+        for image_format in IMAGE_VARIANT_FORMATS
+    }
+    return variants
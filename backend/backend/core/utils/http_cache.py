@@ -0,0 +1,49 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def build_etag(*parts):
+    """
+    Tạo strong ETag từ các giá trị đầu vào (version, max updated_at, count...).
+    """
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def queryset_etag(queryset, *extra):
+    """
+    ETag cho một queryset dựa trên max(updated_at) + số dòng,
+    chỉ tốn 1 query aggregate, không cần serialize.
+    """
+    stats = queryset.order_by().aggregate(last_updated=Max('updated_at'), total=Count('id'))
+    return build_etag(stats['last_updated'], stats['total'], *extra)
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if '*' in etags:
+        return True
+    # If-None-Match dùng so sánh weak => bỏ tiền tố W/
+    return any(tag.removeprefix('W/') == etag for tag in etags)
+
+
+def conditional_response(request, etag, build_response):
+    """
+    Trả 304 nếu client đã có đúng phiên bản (If-None-Match), ngược lại gọi
+    build_response() để tạo Response và gắn header ETag.
+    """
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    return response
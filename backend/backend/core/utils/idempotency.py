@@ -0,0 +1,72 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Chạy handler() đúng 1 lần cho mỗi Idempotency-Key (theo scope + user).
+    - Retry cùng key, cùng payload => trả lại response đã lưu (header Idempotent-Replayed).
+    - Key đang được xử lý ở request khác => 409.
+    - Cùng key nhưng payload khác => 422.
+    Không có header thì chạy handler() bình thường.
+    Chỉ lưu response 2xx, lỗi thì client có thể retry với cùng key.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+
+    user_id = request.user.pk if request.user and request.user.is_authenticated else 'anon'
+    base_key = f"idempotency:{scope}:{user_id}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+    result_key = f"{base_key}:result"
+    lock_key = f"{base_key}:lock"
+    fingerprint = _request_fingerprint(request)
+    timeout = getattr(settings, 'IDEMPOTENCY_KEY_TIMEOUT', 60 * 60 * 24)
+
+    stored = cache.get(result_key)
+    if stored is not None:
+        return _replay(stored, fingerprint)
+
+    # add() là thao tác nguyên tử => chỉ 1 request giữ được lock
+    if not cache.add(lock_key, fingerprint, timeout=60):
+        stored = cache.get(result_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+        return Response(
+            {'error': 'Yêu cầu với Idempotency-Key này đang được xử lý.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    try:
+        response = handler()
+        if status.is_success(response.status_code):
+            cache.set(result_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, timeout=timeout)
+        return response
+    finally:
+        cache.delete(lock_key)
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'error': 'Idempotency-Key đã được dùng cho một yêu cầu khác.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
@@ -0,0 +1,275 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.utils.image_storage import get_image_storage, storage_for
+
+logger = logging.getLogger(__name__)
+
+# đọc upload theo chunk 64KB, chỉ giữ tối đa 256KB đầu file để đọc kích thước ảnh
+IMAGE_CHUNK_SIZE = 64 * 1024
+IMAGE_HEADER_LIMIT = 256 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_UPLOAD_WORKERS', 2),
+                    thread_name_prefix='image-upload',
+                )
+    return _executor
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+class StagedUpload:
+    """
+    File upload đã được ghi ra thư mục tạm + thông tin đọc được trong cùng 1 lượt.
+    """
+
+    def __init__(self, path, sha256, size, image_format, width, height):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.format = image_format
+        self.width = width
+        self.height = height
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _be16(data, offset):
+    return int.from_bytes(data[offset:offset + 2], 'big')
+
+
+def _le(data, offset, length):
+    return int.from_bytes(data[offset:offset + length], 'little')
+
+
+def read_image_size(header):
+    """
+    Đọc (format, width, height) từ phần đầu file ảnh mà không decode cả ảnh.
+    Hỗ trợ JPEG, PNG, GIF, WebP. Chưa đủ byte / không nhận ra => None.
+    """
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and len(header) >= 24:
+        return 'png', int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+    if header[:6] in (b'GIF87a', b'GIF89a') and len(header) >= 10:
+        return 'gif', _le(header, 6, 2), _le(header, 8, 2)
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP' and len(header) >= 30:
+        chunk = header[12:16]
+        if chunk == b'VP8 ':
+            return 'webp', _le(header, 26, 2) & 0x3FFF, _le(header, 28, 2) & 0x3FFF
+        if chunk == b'VP8L':
+            bits = _le(header, 21, 4)
+            return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return 'webp', _le(header, 24, 3) + 1, _le(header, 27, 3) + 1
+        return None
+    if header[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(header):
+            if header[i] != 0xFF:
+                i += 1
+                continue
+            marker = header[i + 1]
+            if marker == 0xFF:
+                i += 1
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            # SOF0..SOF15 (trừ DHT, JPG, DAC) chứa kích thước ảnh
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return 'jpeg', _be16(header, i + 7), _be16(header, i + 5)
+            i += 2 + _be16(header, i + 2)
+    return None
+
+
+def _upload_dir():
+    return getattr(settings, 'IMAGE_UPLOAD_TMP_DIR', None) or os.path.join(tempfile.gettempdir(), 'image_uploads')
+
+
+def failed_upload_path(image_id):
+    """
+    File tạm của ảnh upload thất bại được giữ ở đây để retry (lệnh retry_failed_images).
+    """
+    return os.path.join(_upload_dir(), 'failed', str(image_id))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def stage_upload(file):
+    """
+    Đọc file upload đúng 1 lượt theo chunk: vừa tính SHA-256, vừa kiểm tra dung lượng /
+    kích thước ảnh (đọc từ header), vừa ghi ra thư mục tạm cho worker upload.
+    Bộ nhớ dùng tối đa ~1 chunk + header sniff, không phụ thuộc kích thước file.
+    Ảnh không hợp lệ => InvalidImageError (file tạm bị xóa).
+    """
+    max_bytes = getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+    max_dimension = getattr(settings, 'IMAGE_UPLOAD_MAX_DIMENSION', 8000)
+    directory = _upload_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, uuid.uuid4().hex)
+
+    hasher = hashlib.sha256()
+    size = 0
+    header = b''
+    info = None
+    try:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        with open(path, 'wb') as out:
+            for chunk in file.chunks(chunk_size=IMAGE_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise InvalidImageError(f"Ảnh vượt quá {max_bytes // (1024 * 1024)} MB.")
+                if info is None and len(header) < IMAGE_HEADER_LIMIT:
+                    header += chunk[:IMAGE_HEADER_LIMIT - len(header)]
+                    info = read_image_size(header)
+                    if info is not None:
+                        header = b''
+                        if info[1] > max_dimension or info[2] > max_dimension:
+                            raise InvalidImageError(f"Kích thước ảnh vượt quá {max_dimension}px.")
+                hasher.update(chunk)
+                out.write(chunk)
+        if info is None:
+            raise InvalidImageError("File không phải ảnh hợp lệ (hỗ trợ JPEG, PNG, GIF, WebP).")
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return StagedUpload(path, hasher.hexdigest(), size, *info)
+
+
+def schedule_image_upload(image_id, path, image_hash=None):
+    """
+    Đẩy việc upload cho worker sau khi transaction commit (worker chắc chắn thấy row Image).
+    image_hash là hash của file này: worker so với row để bỏ bản upload đã bị request mới hơn thay thế.
+    """
+    transaction.on_commit(lambda: _submit(image_id, path, image_hash))
+
+
+def _submit(image_id, path, image_hash):
+    if getattr(settings, 'IMAGE_UPLOAD_BACKGROUND', True):
+        _get_executor().submit(_run_in_worker, image_id, path, image_hash)
+    else:
+        process_image_upload(image_id, path, image_hash)
+
+
+def _run_in_worker(image_id, path, image_hash):
+    try:
+        process_image_upload(image_id, path, image_hash)
+    except Exception:
+        logger.exception("Upload ảnh %s thất bại", image_id)
+    finally:
+        # thread của pool không đi qua request cycle => tự đóng connection
+        connection.close()
+
+
+def _upload_with_retries(path):
+    storage = get_image_storage()
+    retries = getattr(settings, 'IMAGE_UPLOAD_MAX_RETRIES', 3)
+    backoff = getattr(settings, 'IMAGE_UPLOAD_RETRY_BACKOFF', 1.0)
+    for attempt in range(retries + 1):
+        try:
+            return storage.save(path)
+        except Exception as e:
+            if attempt == retries:
+                logger.error("Lưu ảnh thất bại sau %s lần: %s", attempt + 1, e)
+                return None
+            logger.warning("Lưu ảnh lỗi (lần %s), thử lại: %s", attempt + 1, e)
+            time.sleep(backoff * (2 ** attempt))
+
+
+def _destroy_quietly(public_id):
+    try:
+        storage_for(public_id).delete(public_id)
+    except Exception as e:
+        logger.warning("Lỗi khi xóa ảnh cũ %s: %s", public_id, e)
+
+
+def _retain_failed(path, image_id):
+    target = failed_upload_path(image_id)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    except OSError as e:
+        logger.warning("Không giữ được file tạm của ảnh %s để retry: %s", image_id, e)
+        _remove_quietly(path)
+
+
+def process_image_upload(image_id, path, image_hash=None):
+    """
+    Lưu file tạm vào storage đang cấu hình (Cloudinary / local, có retry), cập nhật Image.status + public_id.
+    Swap public_id trong select_for_update: ảnh bị thay là ảnh đang nằm trên row lúc swap
+    (không phải lúc request), nên 2 lần sửa chồng nhau không để sót / xóa trùng ảnh.
+    Upload thất bại => status failed, file tạm giữ lại ở failed_upload_path để retry.
+    save() => signal image_saved phát IMAGE_UPDATED cho client.
+    """
+    from api.models import Image
+
+    keep_file = False
+    try:
+        if not Image.objects.filter(pk=image_id).exists():
+            # ảnh đã bị xóa trước khi kịp upload
+            return
+
+        public_id = _upload_with_retries(path)
+        replaced = None
+        with transaction.atomic():
+            image = Image.objects.select_for_update().filter(pk=image_id).first()
+            # row bị xóa trong lúc upload / đã có file mới hơn (worker của file đó tự swap)
+            superseded = image is None or (image_hash is not None and image.image_hash != image_hash)
+            if superseded:
+                pass
+            elif public_id is None:
+                image.status = 'failed'
+                image.save(update_fields=['status', 'updated_at'])
+                keep_file = True
+            else:
+                if image.image:
+                    replaced = getattr(image.image, 'public_id', image.image)
+                image.image = public_id
+                image.status = 'ready'
+                image.save(update_fields=['image', 'status', 'updated_at'])
+
+        if superseded:
+            if public_id:
+                _destroy_quietly(public_id)
+            return
+        if public_id:
+            _remove_quietly(failed_upload_path(image_id))
+        if replaced and replaced != public_id:
+            _destroy_quietly(replaced)
+    finally:
+        if keep_file:
+            _retain_failed(path, image_id)
+        else:
+            _remove_quietly(path)
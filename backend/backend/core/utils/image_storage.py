@@ -0,0 +1,137 @@
+import glob
+import os
+import shutil
+import uuid
+
+import cloudinary.uploader
+from django.conf import settings
+from PIL import Image as PILImage, ImageOps
+
+# public_id của ảnh lưu trên đĩa: "local/<uuid>.<ext>" (CloudinaryField tách ext thành .format)
+LOCAL_PREFIX = 'local/'
+# f_auto với file tĩnh (nginx không chọn được theo Accept) => dùng WebP
+LOCAL_AUTO_FORMAT = 'webp'
+LOCAL_SAVE_OPTIONS = {
+    'webp': {'quality': 80, 'method': 4},
+    'avif': {'quality': 60},
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+}
+_EXTENSION_FORMATS = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png', 'gif': 'gif', 'webp': 'webp', 'avif': 'avif'}
+
+
+class CloudinaryImageStorage:
+    def save(self, path):
+        return cloudinary.uploader.upload(path)['public_id']
+
+    def delete(self, public_id):
+        cloudinary.uploader.destroy(public_id)
+
+
+class LocalImageStorage:
+    """
+    Lưu ảnh gốc trong MEDIA_ROOT/images/original, variant resize lazily
+    (lần đầu có request) rồi cache trên đĩa để nginx phục vụ trực tiếp.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.join(root or settings.MEDIA_ROOT, 'images')
+
+    def save(self, path):
+        with PILImage.open(path) as img:
+            extension = 'jpg' if img.format == 'JPEG' else img.format.lower()
+        name = f"{uuid.uuid4().hex}.{extension}"
+        target = os.path.join(self.root, 'original', name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target + '.tmp')
+        os.replace(target + '.tmp', target)
+        return LOCAL_PREFIX + name
+
+    def delete(self, public_id):
+        stem = os.path.splitext(public_id[len(LOCAL_PREFIX):])[0]
+        for path in glob.glob(os.path.join(self.root, '*', f"{glob.escape(stem)}.*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def find_original(self, stem):
+        matches = glob.glob(os.path.join(self.root, 'original', f"{glob.escape(stem)}.*"))
+        return matches[0] if matches else None
+
+    def variant_path(self, variant, stem, image_format):
+        return os.path.join(self.root, variant, f"{stem}.{image_format}")
+
+    def render_variant(self, variant, stem, image_format, options):
+        """
+        Resize ảnh gốc theo options của variant (width/height/crop giống Cloudinary),
+        ghi file tạm rồi os.replace => request song song không đọc phải file dở.
+        Không có ảnh gốc => None.
+        """
+        original = self.find_original(stem)
+        if original is None:
+            return None
+        target = self.variant_path(variant, stem, image_format)
+        if os.path.exists(target):
+            return target
+
+        with PILImage.open(original) as img:
+            img = ImageOps.exif_transpose(img)
+            width, height = options['width'], options.get('height')
+            if options.get('crop') == 'fill' and height:
+                img = ImageOps.fit(img, (width, height), PILImage.Resampling.LANCZOS)
+            elif img.width > width:
+                # crop=limit: chỉ thu nhỏ, giữ tỉ lệ
+                img = img.resize((width, max(1, round(img.height * width / img.width))), PILImage.Resampling.LANCZOS)
+            if image_format == 'jpeg' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+            img.save(tmp, image_format.upper(), **LOCAL_SAVE_OPTIONS.get(image_format, {}))
+        os.replace(tmp, target)
+        return target
+
+
+def resolve_local_image(value):
+    """
+    (stem, ext) nếu value là ảnh lưu trên đĩa, ngược lại None.
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'public_id'):
+        public_id, extension = value.public_id, getattr(value, 'format', None)
+    else:
+        public_id, dot, extension = str(value).rpartition('.')
+        if not dot:
+            public_id, extension = str(value), None
+    if not public_id or not public_id.startswith(LOCAL_PREFIX):
+        return None
+    return public_id[len(LOCAL_PREFIX):], extension
+
+
+def local_format(image_format):
+    image_format = LOCAL_AUTO_FORMAT if image_format == 'auto' else image_format
+    return _EXTENSION_FORMATS.get(image_format)
+
+
+def local_media_url(*parts):
+    base = getattr(settings, 'IMAGE_LOCAL_BASE_URL', '').rstrip('/')
+    return f"{base}{settings.MEDIA_URL.rstrip('/')}/images/{'/'.join(parts)}"
+
+
+def get_image_storage():
+    """
+    Backend lưu ảnh mới (IMAGE_STORAGE_BACKEND = cloudinary | local).
+    """
+    if getattr(settings, 'IMAGE_STORAGE_BACKEND', 'cloudinary') == 'local':
+        return LocalImageStorage()
+    return CloudinaryImageStorage()
+
+
+def storage_for(public_id):
+    """
+    Backend đang giữ ảnh này (ảnh cũ trên Cloudinary vẫn xóa đúng chỗ sau khi đổi backend).
+    """
+    if str(public_id).startswith(LOCAL_PREFIX):
+        return LocalImageStorage()
+    return CloudinaryImageStorage()
@@ -0,0 +1,230 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.utils.cache_lock import LockTimeout, cache_lock
+from core.utils.realtime import broadcast_utils
+
+logger = logging.getLogger(__name__)
+
+# group nhận ticket của mọi trạm (màn hình tổng / expo)
+KITCHEN_GROUP = "kitchen"
+# món chưa có danh mục => trạm 0
+DEFAULT_STATION = 0
+OPEN_ORDER_STATUSES = ('pending', 'preparing')
+
+BOARD_KEY = "kitchen:board"
+BOARD_LOCK_KEY = "kitchen:board:lock"
+
+
+def station_group(station_id):
+    return f"{KITCHEN_GROUP}.station.{station_id}"
+
+
+def ticket_id(order_id, station_id):
+    return f"{order_id}-{station_id}"
+
+
+def build_tickets(order, items):
+    """
+    Tách order thành ticket theo trạm (trạm = danh mục món).
+    items cần product + product.category đã nạp sẵn.
+    => {station_id: ticket}
+    """
+    tickets = {}
+    for item in items:
+        category = item.product.category
+        station_id = category.id if category else DEFAULT_STATION
+        ticket = tickets.setdefault(station_id, {
+            "id": ticket_id(order.id, station_id),
+            "order_id": order.id,
+            "table_number": order.table.number,
+            "station_id": station_id,
+            "station_name": category.name if category else None,
+            "created_at": order.created_at.isoformat(),
+            "items": [],
+        })
+        ticket["items"].append({
+            "id": item.id,
+            "product_id": item.product_id,
+            "name": item.product.name,
+            "quantity": item.quantity,
+            "note": item.description,
+            "status": item.status,
+        })
+    return tickets
+
+
+def _board_lock():
+    # chỉ 1 worker sửa board tại 1 thời điểm
+    return cache_lock(BOARD_LOCK_KEY)
+
+
+def _load_open_tickets(exclude_order_id=None):
+    from api.models import OrderItem
+
+    items = (
+        OrderItem.objects.filter(order__status__in=OPEN_ORDER_STATUSES)
+        .exclude(order_id=exclude_order_id)
+        .select_related('order__table', 'product__category')
+        .order_by('order_id', 'id')
+    )
+    by_order = {}
+    for item in items:
+        by_order.setdefault(item.order_id, (item.order, []))[1].append(item)
+    board = {}
+    for order, order_items in by_order.values():
+        for station_id, ticket in build_tickets(order, order_items).items():
+            board.setdefault(station_id, {})[ticket["id"]] = ticket
+    return board
+
+
+def get_board():
+    """
+    Hàng đợi ticket đang mở theo trạm, giữ trong cache (Redis) => đọc không chạm DB.
+    Cache bị xóa => dựng lại từ các order đang mở.
+    """
+    board = cache.get(BOARD_KEY)
+    if board is None:
+        try:
+            with _board_lock():
+                board = cache.get(BOARD_KEY)
+                if board is None:
+                    board = _load_open_tickets()
+                    cache.set(BOARD_KEY, board, timeout=None)
+        except LockTimeout:
+            # đọc thẳng từ DB, không ghi cache khi chưa có lock
+            board = _load_open_tickets()
+    return board
+
+
+def _update_board(apply, exclude_order_id=None):
+    """
+    Sửa board trong lock, apply(board) sửa tại chỗ và trả về thay đổi để phát event.
+    Không lấy được lock => không ghi đè board (mất cập nhật của worker khác): xóa board để
+    lần đọc sau dựng lại từ DB, event vẫn tính trên bản board đang có.
+    """
+    try:
+        with _board_lock():
+            board = cache.get(BOARD_KEY)
+            if board is None:
+                board = _load_open_tickets(exclude_order_id=exclude_order_id)
+            result = apply(board)
+            cache.set(BOARD_KEY, board, timeout=None)
+            return result
+    except LockTimeout:
+        board = cache.get(BOARD_KEY)
+        if board is None:
+            board = _load_open_tickets(exclude_order_id=exclude_order_id)
+        result = apply(board)
+        cache.delete(BOARD_KEY)
+        logger.warning("Không lấy được lock board bếp, xóa board để dựng lại từ DB")
+        return result
+
+
+def kitchen_snapshot(station_id=None):
+    """
+    Ticket đang mở (của 1 trạm hoặc tất cả), cũ nhất trước.
+    """
+    board = get_board()
+    stations = [station_id] if station_id is not None else list(board)
+    tickets = [ticket for station in stations for ticket in board.get(station, {}).values()]
+    tickets.sort(key=lambda ticket: (ticket["created_at"], ticket["order_id"], ticket["station_id"]))
+    return tickets
+
+
+def _publish(event_type, ticket):
+    data = {"type": event_type, "id": ticket["id"], "ticket": ticket}
+    broadcast_utils(station_group(ticket["station_id"]), data)
+    broadcast_utils(KITCHEN_GROUP, data)
+
+
+def replace_order_tickets(order_id, tickets):
+    """
+    Ghi ticket mới của 1 order vào board, phát TICKET_CREATED / TICKET_UPDATED / TICKET_CLOSED
+    theo khác biệt so với board hiện tại. tickets rỗng => đóng mọi ticket của order.
+    """
+    def apply(board):
+        previous = {}
+        for station_id, station_tickets in board.items():
+            old = station_tickets.pop(ticket_id(order_id, station_id), None)
+            if old is not None:
+                previous[station_id] = old
+        for station_id, ticket in tickets.items():
+            board.setdefault(station_id, {})[ticket["id"]] = ticket
+        return previous
+
+    # dựng lại board trừ order đang cập nhật => vẫn phát event cho order này
+    previous = _update_board(apply, exclude_order_id=order_id)
+
+    for station_id, ticket in tickets.items():
+        if station_id not in previous:
+            _publish("TICKET_CREATED", ticket)
+        elif previous[station_id] != ticket:
+            _publish("TICKET_UPDATED", ticket)
+    for station_id, ticket in previous.items():
+        if station_id not in tickets:
+            _publish("TICKET_CLOSED", {**ticket, "items": []})
+
+
+def publish_order_tickets(order, items):
+    """
+    Gửi order mới xuống bếp sau khi transaction commit (rollback => không có ticket).
+    """
+    tickets = build_tickets(order, items)
+    transaction.on_commit(lambda: replace_order_tickets(order.id, tickets))
+
+
+def sync_order_tickets(order_id):
+    """
+    Đọc lại order từ DB (chuyển bàn, tách món, đổi trạng thái...) rồi cập nhật ticket.
+    """
+    from api.models import Order, OrderItem
+
+    order = Order.objects.select_related('table').filter(pk=order_id).first()
+    tickets = {}
+    if order is not None and order.status in OPEN_ORDER_STATUSES:
+        items = OrderItem.objects.filter(order=order).select_related('product__category').order_by('id')
+        tickets = build_tickets(order, items)
+    replace_order_tickets(order_id, tickets)
+
+
+def sync_order_tickets_on_commit(order_id):
+    transaction.on_commit(lambda: sync_order_tickets(order_id))
+
+
+def update_ticket_items(item_ids, status, closed_order_ids=()):
+    """
+    Cập nhật trạng thái món ngay trên board (không đọc DB) sau khi chuyển trạng thái hàng loạt.
+    Order đã phục vụ xong => đóng ticket.
+    """
+    item_ids, closed_order_ids = set(item_ids), set(closed_order_ids)
+
+    def apply(board):
+        changed, closed = [], []
+        for station_tickets in board.values():
+            for key, ticket in list(station_tickets.items()):
+                if ticket["order_id"] in closed_order_ids:
+                    closed.append(station_tickets.pop(key))
+                elif any(item["id"] in item_ids for item in ticket["items"]):
+                    ticket = dict(ticket, items=[
+                        dict(item, status=status) if item["id"] in item_ids else item
+                        for item in ticket["items"]
+                    ])
+                    station_tickets[key] = ticket
+                    changed.append(ticket)
+        return changed, closed
+
+    changed, closed = _update_board(apply)
+
+    for ticket in changed:
+        _publish("TICKET_UPDATED", ticket)
+    for ticket in closed:
+        _publish("TICKET_CLOSED", {**ticket, "items": []})
+
+
+def update_ticket_items_on_commit(item_ids, status, closed_order_ids=()):
+    item_ids, closed_order_ids = list(item_ids), list(closed_order_ids)
+    transaction.on_commit(lambda: update_ticket_items(item_ids, status, closed_order_ids))
+
@@ -0,0 +1,77 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.utils.cache_counter import get_counter, incr_counter
+
+CATALOG_VERSION_KEY = "menu:catalog_version"
+
+
+def get_catalog_version():
+    """
+    Trả về version hiện tại của menu (số nguyên tăng dần).
+    Key version không hết hạn, chỉ tăng khi dữ liệu menu thay đổi;
+    bị evict => khởi tạo lại từ thời gian hiện tại, không quay về version cũ.
+    """
+    return get_counter(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Tăng version => mọi payload cache của version cũ không còn được đọc nữa
+    (tự hết hạn theo MENU_CACHE_TIMEOUT).
+    """
+    return incr_counter(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    """
+    Chỉ tăng version sau khi transaction commit, tránh trường hợp request đọc
+    dữ liệu cũ rồi cache lại dưới version mới.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def build_menu_cache_key(prefix, params, version=None):
+    """
+    Key = version + prefix + hash của query params đã chuẩn hóa
+    (sắp xếp theo tên, bỏ giá trị rỗng, strip khoảng trắng).
+    """
+    if version is None:
+        version = get_catalog_version()
+    normalized = sorted(
+        (key, str(value).strip())
+        for key, value in params.items()
+        if value is not None and str(value).strip() != ''
+    )
+    digest = hashlib.md5(repr(normalized).encode('utf-8')).hexdigest()
+    return f"menu:v{version}:{prefix}:{digest}"
+
+
+def get_or_build_menu_payload(prefix, params, builder):
+    """
+    Đọc payload đã serialize từ cache, nếu chưa có thì gọi builder() và lưu lại.
+    builder phải trả về dữ liệu pickle được (list/dict).
+    """
+    key = build_menu_cache_key(prefix, params)
+    payload = cache.get(key)
+    if payload is None:
+        payload = builder()
+        cache.set(key, payload, timeout=getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60))
+    return payload
+
+
+def get_or_build_menu_blob(name, builder):
+    """
+    Blob (bytes) dựng sẵn 1 lần cho mỗi version menu, ví dụ snapshot JSON.
+    Trả về (version, blob) để view dùng version làm ETag.
+    """
+    version = get_catalog_version()
+    key = f"menu:v{version}:blob:{name}"
+    blob = cache.get(key)
+    if blob is None:
+        blob = builder()
+        cache.set(key, blob, timeout=getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60))
+    return version, blob
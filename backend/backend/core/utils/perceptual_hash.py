@@ -0,0 +1,145 @@
+import threading
+
+from PIL import Image as PILImage, UnidentifiedImageError
+from django.db import transaction
+
+from core.utils.cache_counter import get_counter, incr_counter
+
+HASH_SIZE = 8
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """
+    Difference hash 64 bit (hex): ảnh resize / nén lại vẫn cho hash gần giống.
+    Ảnh không đọc được => None.
+    """
+    try:
+        with PILImage.open(path) as img:
+            # JPEG: decode thẳng ở độ phân giải thấp, không giải nén cả ảnh lớn
+            img.draft('L', (hash_size * 8, hash_size * 8))
+            pixels = list(
+                img.convert('L').resize((hash_size + 1, hash_size), PILImage.Resampling.LANCZOS).getdata()
+            )
+    except (OSError, UnidentifiedImageError, ValueError):
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    BK-tree theo khoảng cách Hamming: tìm hash trong bán kính d
+    mà không phải so với toàn bộ ảnh (bất đẳng thức tam giác => bỏ qua nhánh).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """
+        => [(distance, item), ...] sắp xếp theo distance tăng dần.
+        """
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            # list(): worker khác có thể đang thêm ảnh mới vào tree
+            for child_distance, child in list(children.items()):
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+# generation đổi (ảnh bị xóa / đổi hash) => mọi worker dựng lại tree; ảnh mới chỉ cần thêm vào
+INDEX_GENERATION_KEY = "images:phash:generation"
+# ảnh commit muộn có id nhỏ hơn id lớn nhất đã thấy => đọc lùi thêm 1 đoạn
+INDEX_LOOKBACK = 100
+
+_index = {'generation': None, 'tree': None, 'ids': set(), 'max_id': 0}
+_index_lock = threading.Lock()
+
+
+def _add_rows(rows):
+    for image_id, product_id, phash in rows:
+        if image_id in _index['ids']:
+            continue
+        _index['tree'].add(int(phash, 16), (image_id, product_id))
+        _index['ids'].add(image_id)
+        _index['max_id'] = max(_index['max_id'], image_id)
+
+
+def get_catalog_index():
+    """
+    BK-tree của toàn bộ ảnh trong catalog, giữ trong process.
+    Mỗi lần dùng chỉ đọc ảnh mới (id > id lớn nhất đã thấy, dùng primary key index) và thêm vào tree;
+    dựng lại toàn bộ khi khởi động hoặc khi generation đổi (xóa ảnh / đổi ảnh).
+    """
+    from api.models import Image
+
+    generation = get_counter(INDEX_GENERATION_KEY)
+    with _index_lock:
+        rows = Image.objects.exclude(perceptual_hash__isnull=True).values_list('id', 'product_id', 'perceptual_hash')
+        if _index['generation'] != generation:
+            _index.update(tree=BKTree(), ids=set(), max_id=0)
+            _add_rows(rows.iterator())
+            _index['generation'] = generation
+        else:
+            _add_rows(rows.filter(id__gt=_index['max_id'] - INDEX_LOOKBACK))
+        return _index['tree']
+
+
+def invalidate_catalog_index():
+    incr_counter(INDEX_GENERATION_KEY)
+
+
+def invalidate_catalog_index_on_commit():
+    transaction.on_commit(invalidate_catalog_index)
+
+
+def find_near_duplicates(phash, max_distance, exclude_id=None, tree=None):
+    """
+    Ảnh gần giống trong catalog => [{"id", "product_id", "distance"}, ...].
+    tree: index đã lấy sẵn (kiểm tra nhiều ảnh liên tiếp không phải đọc lại).
+    """
+    if phash is None:
+        return []
+    if tree is None:
+        tree = get_catalog_index()
+    return [
+        {"id": image_id, "product_id": product_id, "distance": distance}
+        for distance, (image_id, product_id) in tree.search(int(phash, 16), max_distance)
+        if image_id != exclude_id
+    ]
@@ -1,15 +1,262 @@
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+import msgpack
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
 
-def broadcast_utils(group_name, data):
+from core.utils.realtime_log import record_event
+from core.utils.realtime_queue import record_metrics
+
+logger = logging.getLogger(__name__)
+
+# buffer của request hiện tại (RealtimeBroadcastMiddleware mở / flush)
+_request_buffer = ContextVar('realtime_request_buffer', default=None)
+_unique_keys = itertools.count()
+
+# event mang trạng thái mới nhất của 1 entity => client chậm chỉ cần bản cuối
+IDEMPOTENT_EVENT_TYPES = frozenset({'TABLE_UPDATED', 'FLOOR_UPDATED', 'PRODUCT_UPDATED', 'IMAGE_UPDATED', 'TICKET_UPDATED'})
+
+
+def _event_key(group_name, data):
+    """
+    Key để gộp event trong cùng request: cùng group + type + id => chỉ giữ bản mới nhất.
+    Event không xác định được id thì không gộp.
+    """
+    entity_id = data.get('id')
+    if entity_id is None:
+        for value in data.values():
+            if isinstance(value, dict) and value.get('id') is not None:
+                entity_id = value['id']
+                break
+    if entity_id is None:
+        return (group_name, 'unique', next(_unique_keys))
+    return (group_name, data.get('type'), entity_id)
+
+
+def coalesce_key(data):
+    """
+    Key gộp trong hàng đợi gửi của từng kết nối, None => không được gộp.
+    """
+    if data.get('type') not in IDEMPOTENT_EVENT_TYPES:
+        return None
+    _, event_type, entity_id = _event_key(None, data)
+    if event_type == 'unique':
+        return None
+    return f"{event_type}:{entity_id}"
+
+
+def build_envelopes(messages, max_size=None):
+    """
+    Gộp danh sách (group_name, data) thành ít message nhất có thể:
+    - cùng group + type + id => chỉ giữ bản mới nhất
+    - mỗi group gửi 1 envelope {"type": "BATCH", "events": [...]}, tối đa max_size event/envelope
+    - chỉ có 1 event thì gửi nguyên dạng cũ (client cũ vẫn hiểu)
+    """
+    if max_size is None:
+        max_size = getattr(settings, 'REALTIME_BATCH_MAX_SIZE', 50)
+    latest = {}
+    for group_name, data in messages:
+        key = _event_key(group_name, data)
+        latest.pop(key, None)
+        latest[key] = (group_name, data)
+
+    by_group = {}
+    for group_name, data in latest.values():
+        by_group.setdefault(group_name, []).append(data)
+
+    envelopes = []
+    for group_name, events in by_group.items():
+        for start in range(0, len(events), max_size):
+            chunk = events[start:start + max_size]
+            if len(chunk) == 1:
+                envelopes.append((group_name, chunk[0]))
+            else:
+                envelopes.append((group_name, {"type": "BATCH", "events": chunk}))
+    return envelopes
+
+
+def _stamp_sequences(envelopes):
+    # gắn seq + lưu replay log cho từng message trước khi group_send
+    return [(group_name, record_event(group_name, data)) for group_name, data in envelopes]
+
+
+class RealtimeSender:
+    """
+    Gửi group_send ở thread nền với event loop riêng => request không phải chờ Redis.
+    Hàng đợi có giới hạn, đầy thì bỏ batch cũ nhất. Batch bị bỏ chưa có seq nên client không
+    thấy khoảng trống => group của batch đó nhận RESYNC_REQUIRED (có seq) ở lần gửi kế tiếp,
+    client (useWebSocket onResync) tải lại dữ liệu qua REST.
+    Event đến trong cùng cửa sổ batch_interval (giây) được gộp thành envelope BATCH.
+    """
+
+    def __init__(self, maxsize, batch_interval=0.05):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_interval = batch_interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        # group có event bị bỏ, chờ gửi RESYNC_REQUIRED
+        self._resync_groups = set()
+        self._resync_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='realtime-sender', daemon=True)
+                self._thread.start()
+
+    def submit(self, messages):
+        if not messages:
+            return
+        self._ensure_started()
+        while True:
+            try:
+                self._queue.put_nowait(messages)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    self.mark_resync(group_name for group_name, _ in dropped)
+                    self.dropped += 1
+                    record_metrics({"sender_dropped": 1})
+                    logger.warning("Realtime queue đầy, bỏ batch cũ nhất (đã bỏ %s)", self.dropped)
+                except queue.Empty:
+                    pass
+
+    def mark_resync(self, group_names):
+        with self._resync_lock:
+            self._resync_groups.update(group_names)
+
+    def build_batch(self, messages):
+        """
+        Envelope đã gắn seq cho 1 lượt gửi; RESYNC_REQUIRED của các group bị mất event đứng trước.
+        """
+        with self._resync_lock:
+            resync, self._resync_groups = self._resync_groups, set()
+        markers = [(group_name, {"type": "RESYNC_REQUIRED"}) for group_name in sorted(resync)]
+        return _stamp_sequences(markers + build_envelopes(messages))
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        layer = get_channel_layer()
+        while True:
+            messages = list(self._queue.get())
+            # chờ thêm tới hết cửa sổ batch để gộp các event của thao tác hàng loạt
+            deadline = time.monotonic() + self.batch_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    messages.extend(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                loop.run_until_complete(_send_messages(layer, self.build_batch(messages)))
+            except Exception:
+                logger.exception("Gửi realtime event thất bại")
+                # event không tới được client => lần gửi sau báo resync
+                self.mark_resync(group_name for group_name, _ in messages)
+
+
+def build_broadcast_message(data):
+    """
+    Encode payload 1 lần khi group_send, chỉ 1 bản JSON text đi qua channel layer.
+    Consumer gửi lại text cho client JSON; client MessagePack dùng packed_from_text.
+    """
+    return {
+        "type": "broadcast",
+        # seq để consumer giữ đúng thứ tự mà không phải decode lại payload
+        "seq": data.get("seq"),
+        "coalesce": coalesce_key(data),
+        "text": json.dumps(data),
+    }
+
+
+@functools.lru_cache(maxsize=256)
+def packed_from_text(text):
+    """
+    JSON text => MessagePack bytes, cache theo nội dung: mỗi message chỉ convert 1 lần
+    trong 1 process dù nhiều socket MessagePack cùng nhận.
+    """
+    return msgpack.packb(json.loads(text), use_bin_type=True)
+
+
+async def _send_messages(layer, messages):
+    for group_name, data in messages:
+        await layer.group_send(group_name, build_broadcast_message(data))
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = RealtimeSender(
+                    getattr(settings, 'REALTIME_QUEUE_SIZE', 1000),
+                    batch_interval=getattr(settings, 'REALTIME_BATCH_INTERVAL', 0.05),
+                )
+    return _sender
+
+
+def dispatch_messages(messages):
+    """
+    Đẩy danh sách (group_name, data) ra channel layer.
+    REALTIME_BACKGROUND_SENDER = False => gửi đồng bộ (test, management command).
+    """
+    if not messages:
+        return
     layer = get_channel_layer()
     if layer is None:
         raise RuntimeError("Channel layer chưa được cấu hình")
+    if getattr(settings, 'REALTIME_BACKGROUND_SENDER', True):
+        get_sender().submit(messages)
+    else:
+        async_to_sync(_send_messages)(layer, _stamp_sequences(build_envelopes(messages)))
+
+
+def _enqueue(group_name, data):
+    buffer = _request_buffer.get()
+    if buffer is None:
+        dispatch_messages([(group_name, data)])
+        return
+    key = _event_key(group_name, data)
+    # pop rồi gán lại => event mới nhất nằm cuối, giữ đúng thứ tự
+    buffer.pop(key, None)
+    buffer[key] = (group_name, data)
+
+
+def broadcast_utils(group_name, data):
+    """
+    Gửi event tới group sau khi transaction commit (rollback thì không gửi).
+    Trong request: gom lại, gộp event trùng và gửi 1 lần khi response xong.
+    """
+    transaction.on_commit(lambda: _enqueue(group_name, data))
+
+
+def open_request_buffer():
+    return _request_buffer.set({})
+
 
-    async_to_sync(layer.group_send)(
-        group_name,
-        {
-            "type": "broadcast",
-            "data": data,
-        }
-    )
\ No newline at end of file
+def flush_request_buffer(token):
+    buffer = _request_buffer.get()
+    _request_buffer.reset(token)
+    if buffer:
+        dispatch_messages(list(buffer.values()))
@@ -0,0 +1,24 @@
+# group WebSocket theo phạm vi: mỗi thiết bị chỉ join group chứa event nó cần
+
+STAFF_ROLES = ('admin', 'waiter', 'chef', 'cashier')
+
+# màn hình nhân viên: event của mọi bàn
+TABLES_GROUP = "tables"
+
+
+def table_group(table_id):
+    # tablet đặt tại bàn: chỉ event của bàn đó
+    return f"{TABLES_GROUP}.table.{table_id}"
+
+
+def table_groups(table_id):
+    return [TABLES_GROUP, table_group(table_id)]
+
+
+def user_role(user):
+    """
+    Role của user trong scope WebSocket, chưa đăng nhập => None.
+    """
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    return getattr(user, 'role', None)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.utils.cache_counter import get_counter, incr_counter
+
+
+def _seq_key(group_name):
+    return f"realtime:seq:{group_name}"
+
+
+def _event_key(group_name, seq):
+    return f"realtime:log:{group_name}:{seq}"
+
+
+def current_sequence(group_name):
+    return get_counter(_seq_key(group_name))
+
+
+def next_sequence(group_name):
+    """
+    Số thứ tự tăng dần theo từng group (cache.incr là nguyên tử trên Redis
+    nên nhiều worker dùng chung được). Key bị evict => seq mới vẫn lớn hơn seq
+    client đã nhận, replay thấy khoảng trống quá lớn => RESYNC_REQUIRED.
+    """
+    return incr_counter(_seq_key(group_name))
+
+
+def record_event(group_name, data):
+    """
+    Gắn seq vào event và lưu vào replay log (mỗi seq 1 key, tự hết hạn sau
+    REALTIME_REPLAY_TTL giây). Trả về event đã gắn seq.
+    """
+    seq = next_sequence(group_name)
+    data = dict(data, seq=seq)
+    cache.set(_event_key(group_name, seq), data, timeout=getattr(settings, 'REALTIME_REPLAY_TTL', 600))
+    return data
+
+
+def events_since(group_name, since):
+    """
+    Các event có seq > since theo đúng thứ tự.
+    Trả về None nếu không replay được (khoảng trống quá REALTIME_REPLAY_SIZE
+    hoặc event đã hết hạn) => client phải tải lại toàn bộ qua REST.
+    """
+    current = current_sequence(group_name)
+    if since == current:
+        return []
+    if since > current:
+        # seq phía server đã bị reset (cache bị xóa)
+        return None
+    if current - since > getattr(settings, 'REALTIME_REPLAY_SIZE', 500):
+        return None
+    keys = [_event_key(group_name, seq) for seq in range(since + 1, current + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [found[key] for key in keys]
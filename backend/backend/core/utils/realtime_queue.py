@@ -0,0 +1,91 @@
+import asyncio
+import itertools
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache
+
+METRIC_NAMES = ('coalesced', 'dropped', 'evicted', 'sender_dropped')
+# đúng 1 marker RESYNC_REQUIRED trong hàng đợi, luôn nằm ở đầu
+RESYNC_KEY = "resync"
+
+
+def _metric_key(name):
+    return f"realtime:metrics:{name}"
+
+
+def record_metrics(stats):
+    """
+    Cộng dồn bộ đếm realtime vào cache (dùng chung mọi worker).
+    """
+    for name, count in stats.items():
+        if not count:
+            continue
+        key = _metric_key(name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, count, timeout=None)
+
+
+def realtime_metrics():
+    found = cache.get_many([_metric_key(name) for name in METRIC_NAMES])
+    return {name: found.get(_metric_key(name), 0) for name in METRIC_NAMES}
+
+
+def _event_seq(event):
+    if event.get("seq") is not None:
+        return event["seq"]
+    return (event.get("data") or {}).get("seq")
+
+
+class SendQueue:
+    """
+    Hàng đợi gửi của 1 kết nối WebSocket (1 writer, chạy trong event loop của consumer).
+    - event idempotent cùng key => bản mới thay bản đang chờ (chuyển xuống cuối, giữ thứ tự seq)
+    - vượt max_size => bỏ event cũ nhất, đặt RESYNC_REQUIRED ở đầu để client tải lại qua REST
+    stats đếm số event bị gộp / bị bỏ cho tới lần pop_stats kế tiếp.
+    """
+
+    def __init__(self, max_size):
+        # cần chỗ cho marker + ít nhất 1 event
+        self.max_size = max(2, max_size)
+        self._items = OrderedDict()
+        self._keys = itertools.count()
+        self._ready = asyncio.Event()
+        self.stats = Counter()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, event, key=None):
+        if key is not None and self._items.pop(key, None) is not None:
+            self.stats["coalesced"] += 1
+        self._items[key if key is not None else next(self._keys)] = event
+        while len(self._items) > self.max_size:
+            self._drop_oldest()
+        self._ready.set()
+
+    def _drop_oldest(self):
+        marker = self._items.pop(RESYNC_KEY, None)
+        _, dropped = self._items.popitem(last=False)
+        self.stats["dropped"] += 1
+        seq = _event_seq(dropped)
+        if seq is None and marker is not None:
+            seq = marker["data"]["seq"]
+        self._items[RESYNC_KEY] = {"data": {"type": "RESYNC_REQUIRED", "seq": seq}}
+        self._items.move_to_end(RESYNC_KEY, last=False)
+
+    async def get(self):
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popitem(last=False)[1]
+
+    def clear(self):
+        self.stats["dropped"] += len(self._items)
+        self._items.clear()
+
+    def pop_stats(self):
+        stats, self.stats = self.stats, Counter()
+        return stats
@@ -0,0 +1,54 @@
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, DecimalField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast
+
+
+def normalize_search_text(value):
+    """
+    Chuẩn hóa chuỗi để tìm kiếm: bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng.
+    "Phở Bò Đặc Biệt" -> "pho bo dac biet"
+    """
+    if not value:
+        return ''
+    value = str(value).replace('đ', 'd').replace('Đ', 'D')
+    value = unicodedata.normalize('NFD', value)
+    value = ''.join(ch for ch in value if unicodedata.category(ch) != 'Mn')
+    return ' '.join(value.lower().split())
+
+
+def search_products(queryset, term, field='search_text'):
+    """
+    Lọc + xếp hạng theo cột search_text (đã bỏ dấu, lưu khi save Product).
+    - PostgreSQL: LIKE dùng GIN trigram index, xếp hạng bằng TrigramSimilarity,
+      thêm trigram_word_similar để chấp nhận gõ sai nhẹ.
+    - Backend khác (SQLite khi test): LIKE + ưu tiên kết quả khớp đầu chuỗi.
+    Kết quả có annotate `search_rank` (lớn hơn = liên quan hơn).
+    """
+    normalized = normalize_search_text(term)
+    if not normalized:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return queryset.filter(
+            Q(**{f'{field}__contains': normalized}) |
+            Q(**{f'{field}__trigram_word_similar': normalized})
+        ).annotate(
+            # similarity là real (float4): đổi sang numeric để cursor phân trang so sánh đúng
+            # giá trị đã trả về (float4 đọc ra rồi so dạng float8 sẽ lệch => mất dòng bằng điểm)
+            search_rank=Cast(
+                TrigramWordSimilarity(Value(normalized), field),
+                output_field=DecimalField(max_digits=7, decimal_places=6),
+            )
+        ).order_by('-search_rank', 'id')
+
+    return queryset.filter(**{f'{field}__contains': normalized}).annotate(
+        search_rank=Case(
+            When(**{f'{field}__startswith': normalized}, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank', 'id')
@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from core.utils.cache_lock import LockTimeout, cache_lock
+from core.utils.realtime import broadcast_utils
+from core.utils.realtime_groups import TABLES_GROUP
+
+TABLE_STATUSES = ('available', 'occupied', 'reserved')
+
+# {table_id: (status, capacity)} của bàn đang bật, chỉ đọc khi ghi
+FLOOR_STATE_KEY = "tables:floor:state"
+# tổng hợp nhỏ cho màn hình đón khách, đọc không chạm DB
+FLOOR_SUMMARY_KEY = "tables:floor:summary"
+FLOOR_LOCK_KEY = "tables:floor:lock"
+
+
+def set_table_status(table, status):
+    """
+    Điểm duy nhất đổi Table.status. Không đổi => không ghi DB.
+    Signal post_save của Table phát TABLE_UPDATED và cập nhật aggregate sau commit.
+    """
+    if status not in TABLE_STATUSES:
+        raise ValueError(f"Trạng thái bàn không hợp lệ: {status}")
+    if table.status == status:
+        return False
+    table.status = status
+    table.save(update_fields=['status'])
+    return True
+
+
+def _empty_counts():
+    return {status: 0 for status in TABLE_STATUSES}
+
+
+def _apply(summary, entry, delta):
+    status, capacity = entry
+    summary["total"] += delta
+    summary["counts"][status] += delta
+    bucket = summary["by_capacity"].setdefault(str(capacity), _empty_counts())
+    bucket[status] += delta
+    if not any(bucket.values()):
+        del summary["by_capacity"][str(capacity)]
+
+
+def _build_floor():
+    from api.models import Table
+
+    state = {
+        table_id: (status, capacity)
+        for table_id, status, capacity in Table.objects.filter(is_active=True).values_list('id', 'status', 'capacity')
+    }
+    summary = {"version": 0, "total": 0, "counts": _empty_counts(), "by_capacity": {}}
+    for entry in state.values():
+        _apply(summary, entry, 1)
+    return state, summary
+
+
+def _load_floor():
+    found = cache.get_many([FLOOR_STATE_KEY, FLOOR_SUMMARY_KEY])
+    if len(found) == 2:
+        return found[FLOOR_STATE_KEY], found[FLOOR_SUMMARY_KEY]
+    state, summary = _build_floor()
+    cache.set_many({FLOOR_STATE_KEY: state, FLOOR_SUMMARY_KEY: summary}, timeout=None)
+    return state, summary
+
+
+def floor_summary():
+    """
+    Số bàn theo trạng thái + theo sức chứa, đọc 1 key cache.
+    Cache trống => dựng lại từ bảng Table (1 query).
+    """
+    summary = cache.get(FLOOR_SUMMARY_KEY)
+    if summary is None:
+        try:
+            with cache_lock(FLOOR_LOCK_KEY):
+                summary = _load_floor()[1]
+        except LockTimeout:
+            # đếm thẳng từ DB, không ghi cache khi chưa có lock
+            summary = _build_floor()[1]
+    return summary
+
+
+def update_floor(table_id, status=None, capacity=None):
+    """
+    Cập nhật aggregate theo trạng thái mới của 1 bàn (status None => bàn bị tắt / xóa),
+    chỉ trừ bucket cũ + cộng bucket mới, không đếm lại cả bảng.
+    Không lấy được lock => không ghi đè aggregate (mất cập nhật của worker khác): xóa cache để
+    lần đọc sau dựng lại, client nhận số đếm lại từ DB (thay đổi của bàn đã commit).
+    """
+    entry = (status, capacity) if status is not None else None
+    try:
+        with cache_lock(FLOOR_LOCK_KEY):
+            state, summary = _load_floor()
+            previous = state.get(table_id)
+            if previous == entry:
+                return
+            if previous is not None:
+                _apply(summary, previous, -1)
+                del state[table_id]
+            if entry is not None:
+                _apply(summary, entry, 1)
+                state[table_id] = entry
+            summary["version"] += 1
+            cache.set_many({FLOOR_STATE_KEY: state, FLOOR_SUMMARY_KEY: summary}, timeout=None)
+    except LockTimeout:
+        cache.delete_many([FLOOR_STATE_KEY, FLOOR_SUMMARY_KEY])
+        summary = _build_floor()[1]
+
+    # id cố định => nhiều bàn đổi trong cùng request / hàng đợi gửi chỉ giữ bản mới nhất
+    broadcast_utils(TABLES_GROUP, {"type": "FLOOR_UPDATED", "id": "floor", "summary": summary})
+
+
+def update_floor_on_commit(table):
+    table_id, capacity = table.id, table.capacity
+    status = table.status if table.is_active else None
+    transaction.on_commit(lambda: update_floor(table_id, status, capacity))
+
+
+def remove_from_floor_on_commit(table_id):
+    transaction.on_commit(lambda: update_floor(table_id))
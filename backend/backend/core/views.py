@@ -1,3 +1,38 @@
-from django.shortcuts import render
+import os
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.http import FileResponse, Http404
+
+from core.utils.cloudinary_image_utils import IMAGE_VARIANTS
+from core.utils.image_storage import LocalImageStorage, local_format
+
+LOCAL_IMAGE_NAME = re.compile(r'^[0-9a-f]{32}$')
+
+
+def local_image_variant(request, variant, filename):
+    """
+    /media/images/<variant>/<uuid>.<format>: nginx phục vụ nếu file đã có,
+    chưa có => nginx chuyển về đây, resize từ ảnh gốc rồi cache trên đĩa.
+    """
+    stem, extension = os.path.splitext(filename)
+    image_format = local_format(extension.lstrip('.'))
+    if not LOCAL_IMAGE_NAME.match(stem) or image_format is None:
+        raise Http404
+
+    storage = LocalImageStorage()
+    if variant == 'original':
+        # chạy không có nginx (dev): Django tự phục vụ ảnh gốc
+        path = storage.find_original(stem)
+        if path is None or local_format(os.path.splitext(path)[1].lstrip('.')) != image_format:
+            raise Http404
+    elif variant in IMAGE_VARIANTS:
+        path = storage.render_variant(variant, stem, image_format, IMAGE_VARIANTS[variant])
+        if path is None:
+            raise Http404
+    else:
+        raise Http404
+
+    response = FileResponse(open(path, 'rb'), content_type=f"image/{image_format}")
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'IMAGE_LOCAL_CACHE_MAX_AGE', 7 * 24 * 3600)}"
+    return response
@@ -1,4 +1,5 @@
 import api from "./axiosClient";
+import type { ImageVariants } from "./product.api";
 
 export interface RNfile {
     uri: string;
@@ -12,13 +13,22 @@ export interface ImageInterface {
     is_primary: boolean;
     create_at?: string;
     image_url?: string;
+    image_variants?: ImageVariants | null;
+    position?: number;
+    status?: "pending" | "ready" | "failed";
+}
+
+export interface BulkUploadResult {
+    created: ImageInterface[];
+    skipped: { name: string; reason: "invalid" | "duplicate" | "near_duplicate"; detail?: string }[];
+    near_duplicates: Record<string, { id: number; product_id: number; distance: number }[]>;
 }
 
 function isRNfile(image: string | RNfile): image is RNfile {
     return (image as RNfile).uri !== undefined;
 }
 
-type ImageCreate = Omit<ImageInterface, "id" | "create_at" | "image_url">;
+type ImageCreate = Omit<ImageInterface, "id" | "create_at" | "image_url" | "image_variants" | "position" | "status">;
 type ImageUpdate = Partial<ImageCreate>;
 
 export const ImageApi = {
@@ -80,6 +90,33 @@ export const ImageApi = {
         }
     },
 
+    // Upload nhiều ảnh 1 request, server tự bỏ ảnh trùng / không hợp lệ
+    bulkCreate: async (productId: number, images: RNfile[]) => {
+        const formData = new FormData();
+        images.forEach((image) => {
+            formData.append("images", {
+                uri: image.uri,
+                name: image.fileName || "image.jpg",
+                type: image.type || "image/jpeg",
+            });
+        });
+        const { data } = await api.post<BulkUploadResult>(
+            `/products/${productId}/images/bulk`,
+            formData,
+            {
+                headers: { "Content-Type": "multipart/form-data" },
+                _skipAuthRefresh: true,
+            }
+        );
+        return data;
+    },
+
+    // Sắp xếp lại toàn bộ ảnh + chọn ảnh chính trong 1 request
+    reorder: async (productId: number, order: number[], primary?: number) => {
+        const { data } = await api.put<ImageInterface[]>(`/products/${productId}/images/reorder`, { order, primary });
+        return data;
+    },
+
     remove: async (productId: number, id: number) => {
         await api.delete(`/products/${productId}/images/${id}`);
     },
@@ -15,10 +15,19 @@ export interface ProductInterface {
     image?: string;
     // image_url dùng cho hiển thị
     image_url?: string;
+    // ảnh đã resize sẵn theo chỗ hiển thị (thumb/card/full) + srcset AVIF/WebP
+    image_variants?: ImageVariants | null;
     
     is_menu_active?: boolean;
 }
 
+export interface ImageVariants {
+    thumb: string;
+    card: string;
+    full: string;
+    srcset: { avif: string; webp: string };
+}
+
 export interface ProductImage {
     uri: string;
     type?: string;
@@ -26,7 +35,7 @@ export interface ProductImage {
 }
 
 // utility types tạo kiểu con thích hợp cho create/update
-type ProductCreate = Omit<ProductInterface, "id" | "created_at" | "updated_at" | "status" > & { image?: ProductImage };
+type ProductCreate = Omit<ProductInterface, "id" | "created_at" | "updated_at" | "status" | "image_variants" > & { image?: ProductImage };
 type ProductUpdate = Partial<ProductCreate>;
 
 export const ProductApi = {
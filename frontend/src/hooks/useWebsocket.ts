@@ -1,18 +1,40 @@
 import { useEffect, useRef } from "react";
+import AsyncStorage from "@react-native-async-storage/async-storage";
 
 type Listener = (data: any) => void;
+type ResyncHandler = () => void;
 
 const sockets: Record<string, WebSocket> = {};
 // Danh sách các function sẽ được gọi khi nhận message
 const listenersMap: Record<string, Set<Listener>> = {};
+// Các hàm tải lại dữ liệu qua REST khi server báo RESYNC_REQUIRED (đã lỡ event, không gửi bù được)
+const resyncMap: Record<string, Set<ResyncHandler>> = {};
+// seq cuối cùng đã nhận theo từng url -> kết nối lại với ?since=<seq> để nhận bù event bị lỡ
+const lastSeqMap: Record<string, number> = {};
+// url đang đọc token, chưa tạo socket
+const pendingUrls = new Set<string>();
+// server từ chối handshake (chưa đăng nhập / không đủ quyền) -> không reconnect
+const REJECTED_CODES = [4401, 4403];
 
 // Hàm kết nối WebSocket
-const connect = (url: string) => {
+const connect = async (url: string) => {
     // Nếu đã kết nối cho Url đó thì không kết nối lại
     if (sockets[url] && sockets[url]?.readyState === WebSocket.OPEN || sockets[url]?.readyState === WebSocket.CONNECTING) return;
+    if (pendingUrls.has(url)) return;
+
+    pendingUrls.add(url);
+    // Gắn access token (nếu đã đăng nhập) để server xác định role
+    const token = await AsyncStorage.getItem("access_token");
+    pendingUrls.delete(url);
+    if (!listenersMap[url] || listenersMap[url].size === 0) return;
 
     // Tạo socket mới là lưu vào sockets
-    const socket = new WebSocket(url);
+    const params: string[] = [];
+    if (token) params.push(`token=${encodeURIComponent(token)}`);
+    const since = lastSeqMap[url];
+    if (since !== undefined) params.push(`since=${since}`);
+    const socketUrl = params.length ? `${url}${url.includes("?") ? "&" : "?"}${params.join("&")}` : url;
+    const socket = new WebSocket(socketUrl);
     sockets[url] = socket;
 
     // Tạo mới nếu url không có tập listener dành riêng cho url đó
@@ -27,15 +49,33 @@ const connect = (url: string) => {
         try {
             // Chuyển chuỗi JSON -> object
             const data = JSON.parse(event.data);
+            if (data?.type === "RESYNC_REQUIRED") {
+                // server không còn đủ event để gửi bù -> screen tải lại dữ liệu qua REST
+                if (typeof data.seq === "number") lastSeqMap[url] = data.seq;
+                resyncMap[url]?.forEach((resync) => resync());
+                return;
+            } else if (typeof data?.seq === "number") {
+                // event replay và event live có thể trùng -> bỏ event đã nhận
+                if (lastSeqMap[url] !== undefined && data.seq <= lastSeqMap[url]) return;
+                lastSeqMap[url] = data.seq;
+            }
+            // Server gộp nhiều event thành envelope BATCH -> tách ra từng event như cũ
+            const events = data?.type === "BATCH" ? data.events : [data];
             // Gọi từng listener
-            listenersMap[url].forEach((listener) => listener(data));
+            events.forEach((item: any) => {
+                listenersMap[url].forEach((listener) => listener(item));
+            });
         } catch (error) {
             console.log("JSON parse error:", error);
         }
     };
 
     // Nếu WebSocket bị đóng -> kết nối lại sau 2s
-    socket.onclose = () => {
+    socket.onclose = (event) => {
+        if (REJECTED_CODES.includes(event.code)) {
+            console.log("⛔ WebSocket rejected:", event.code, url);
+            return;
+        }
         console.log("❌ WebSocket Closed → reconnecting in 2 seconds...", url);
         
         // Chỉ reconnect nếu còn listener
@@ -46,29 +86,45 @@ const connect = (url: string) => {
 }
 
 // Hook sử dụng trong các screen React Native
-export const useWebSocket = (callback: Listener, url: string) => {
+// onResync: tải lại toàn bộ dữ liệu của screen khi bị lỡ event (RESYNC_REQUIRED)
+export const useWebSocket = (callback: Listener, url: string, onResync?: ResyncHandler) => {
     
     // Dùng Ref để luôn gọi phiên bản mới nhất của callback
     const callbackRef = useRef(callback);
     callbackRef.current = callback;
+    const onResyncRef = useRef(onResync);
+    onResyncRef.current = onResync;
 
     useEffect(() => {
 
         const wrapper = (data: any) => {
+            // marker nằm trong BATCH cũng phải tải lại, không chuyển cho listener
+            if (data?.type === "RESYNC_REQUIRED") {
+                onResyncRef.current?.();
+                return;
+            }
             callbackRef.current(data);
         };
+        const resync = () => {
+            onResyncRef.current?.();
+        };
 
         if (!listenersMap[url]) {
             listenersMap[url] = new Set();
         }
+        if (!resyncMap[url]) {
+            resyncMap[url] = new Set();
+        }
 
         listenersMap[url].add(wrapper);
+        resyncMap[url].add(resync);
 
         connect(url);
 
         // Cleanup khi component unmount
         return () => {
             listenersMap[url].delete(wrapper);
+            resyncMap[url].delete(resync);
 
             // Nếu không còn listener -> tự đóng socket
             if (listenersMap[url].size === 0) {
@@ -56,7 +56,7 @@ const AdminProduct = () => {
       
       const productWithImages = products.map(product => ({
         ...product,
-        image: product.image_url ?? "https://via.placeholder.com/40x30"
+        image: product.image_variants?.thumb ?? product.image_url ?? "https://via.placeholder.com/40x30"
       }));
 
       const sorted = [...productWithImages].sort(
@@ -86,7 +86,7 @@ const AdminProduct = () => {
         setProducts(prev => [
           {
             ...message.product,
-            image: message.product.image_url ?? "https://via.placeholder.com/40x30"
+            image: message.product.image_variants?.thumb ?? message.product.image_url ?? "https://via.placeholder.com/40x30"
           },
           ...prev,
         ]);
@@ -98,7 +98,7 @@ const AdminProduct = () => {
             item.id === message.product.id
             ? {
                 ...message.product,
-                image: message.product.image_url ?? "https://via.placeholder.com/40x30"
+                image: message.product.image_variants?.thumb ?? message.product.image_url ?? "https://via.placeholder.com/40x30"
               }
             : item
           )
@@ -112,7 +112,7 @@ const AdminProduct = () => {
       default:
         console.log("❓ Unknown realtime type", message.type);
     }
-  }, 'ws://10.0.2.2:8000/ws/products/');
+  }, 'ws://10.0.2.2:8000/ws/products/', fetchProducts);
 
   // --- REALTIME IMAGE UPDATE ---
   useWebSocket((message) => {
@@ -124,7 +124,7 @@ const AdminProduct = () => {
           item.id === message.product_id
           ? {
               ...item,
-              image: message.image_url ?? "https://via.placeholder.com/40x30"
+              image: message.image_variants?.thumb ?? message.image_url ?? "https://via.placeholder.com/40x30"
             }
           : item
         )
@@ -142,7 +142,7 @@ const AdminProduct = () => {
         )
       )
     }
-  }, 'ws://10.0.2.2:8000/ws/images/');
+  }, 'ws://10.0.2.2:8000/ws/images/', fetchProducts);
 
 
   // Chức năng xóa sản phẩm